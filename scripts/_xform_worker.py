@@ -0,0 +1,49 @@
+#!/usr/bin/env python3
+"""Long-lived XForm worker used by the benchmarks to skip interpreter startup.
+
+Reads one job per line from stdin as ``<xml>\\t<xform>\\t<marker>`` and answers
+with the elapsed seconds for reading, parsing, evaluating and serializing, or
+with ``ERROR <message>`` if the run failed or the output lacks ``<marker>``.
+"""
+from __future__ import annotations
+
+import sys
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+from zopyx.xform.eval import eval_module  # noqa: E402
+from zopyx.xform.parser import Parser  # noqa: E402
+from zopyx.xform.xmlmodel import parse_xml, serialize  # noqa: E402
+
+
+def _run(xml: str, xform: str) -> str:
+    xml_text = Path(xml).read_text(encoding="utf-8")
+    xform_text = Path(xform).read_text(encoding="utf-8")
+    doc = parse_xml(xml_text)
+    module = Parser(xform_text).parse_module()
+    result = eval_module(module, doc)
+    return "".join(serialize(item) if hasattr(item, "kind") else str(item) for item in result)
+
+
+def main() -> int:
+    while line := sys.stdin.readline():
+        xml, xform, marker = line.rstrip("\n").split("\t")
+        start = time.perf_counter_ns()
+        try:
+            output = _run(xml, xform)
+        except Exception as exc:  # report and keep serving
+            reply = f"ERROR {exc!r}"
+        else:
+            elapsed = time.perf_counter_ns() - start
+            reply = f"{elapsed * 1e-9}" if marker in output else f"ERROR missing {marker}"
+        sys.stdout.write(reply + "\n")
+        sys.stdout.flush()
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -7,8 +7,13 @@ import subprocess
 import sys
 import tempfile
 import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import ExitStack
+from functools import partial
+from itertools import cycle
 from pathlib import Path
 from statistics import median
+from typing import Callable
 
 ROOT = Path(__file__).resolve().parents[1]
 
@@ -24,44 +29,42 @@ ITEMS = int(os.getenv("XF_BENCH_ITEMS", "20000"))
 GROUPS = int(os.getenv("XF_BENCH_GROUPS", "50"))
 RUNS = int(os.getenv("XF_BENCH_RUNS", "3"))
 WARMUP = int(os.getenv("XF_BENCH_WARMUP", "1"))
+INPROC = os.getenv("XF_BENCH_INPROC", "0") == "1"
+PARALLEL = os.getenv("XF_BENCH_PARALLEL", "0") == "1"
+WORKER = os.getenv("XF_BENCH_WORKER", "0") == "1"
+COMPILED = os.getenv("XF_BENCH_COMPILED", "0") == "1"
 
 BIN_RUST = ROOT / "xform-rs" / "target" / "release" / "xform"
 BIN_TS = ROOT / "xform-ts" / "dist" / "cli.js"
 BIN_GO = ROOT / "xform-go" / "bin" / "xform"
 BIN_SWIFT = ROOT / "xform-swift" / ".build" / "release" / "xform-swift"
+WORKER_SCRIPT = ROOT / "scripts" / "_xform_worker.py"
 
 
-def _cmd_for(lang: str, xml: Path, xform: Path) -> list[str] | None:
+def _cmd_prefix(lang: str) -> list[str] | None:
     if lang == "python":
-        return [sys.executable, "-m", "zopyx.xform.cli", str(xml), str(xform)]
+        return [sys.executable, "-m", "zopyx.xform.cli"]
     if lang == "rust":
-        if not BIN_RUST.exists():
-            return None
-        return [str(BIN_RUST), str(xml), str(xform)]
+        return [str(BIN_RUST)] if BIN_RUST.exists() else None
     if lang == "ts":
-        if not BIN_TS.exists():
-            return None
-        return ["node", str(BIN_TS), str(xml), str(xform)]
+        return ["node", str(BIN_TS)] if BIN_TS.exists() else None
     if lang == "go":
-        if not BIN_GO.exists():
-            return None
-        return [str(BIN_GO), str(xml), str(xform)]
+        return [str(BIN_GO)] if BIN_GO.exists() else None
     if lang == "swift":
-        if not BIN_SWIFT.exists():
-            return None
-        return [str(BIN_SWIFT), str(xml), str(xform)]
+        return [str(BIN_SWIFT)] if BIN_SWIFT.exists() else None
     return None
 
 
 def _generate_xml(path: Path, items: int, groups: int) -> None:
-    lines = ["<data>"]
-    for i in range(items):
-        g = i % groups
-        lines.append(
-            f"  <item id=\"{i}\"><category>g{g}</category><value>{(i * 7) % 1000}</value></item>"
-        )
-    lines.append("</data>")
-    path.write_text("\n".join(lines), encoding="utf-8")
+    tmpl = b'  <item id="%d"><category>g%d</category><value>%d</value></item>\n'
+    with path.open("wb", buffering=1 << 20) as fh:
+        fh.write(b"<data>\n")
+        # Both derived columns are periodic, so cycle precomputed values and let
+        # map/zip drive the formatting loop at C level.
+        values = [(i * 7) % 1000 for i in range(1000)]
+        rows = zip(range(items), cycle(range(groups)), cycle(values))
+        fh.writelines(map(tmpl.__mod__, rows))
+        fh.write(b"</data>\n")
 
 
 def _generate_xform(path: Path) -> None:
@@ -93,18 +96,76 @@ let items := .//item in
 
 
 def _run_cmd(cmd: list[str]) -> tuple[float, str]:
-    start = time.perf_counter()
-    result = subprocess.run(cmd, capture_output=True, text=True)
-    end = time.perf_counter()
+    start = time.perf_counter_ns()
+    result = subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    end = time.perf_counter_ns()
+    stderr = result.stderr.decode("utf-8", errors="replace").strip()
     if result.returncode != 0:
-        raise RuntimeError(result.stderr.strip() or f"Command failed: {cmd}")
-    if "<report" not in result.stdout:
+        raise RuntimeError(stderr or f"Command failed: {cmd}")
+    if b"<report" not in result.stdout:
         raise RuntimeError("Unexpected output (missing <report>)")
-    return end - start, result.stderr.strip()
+    return (end - start) * 1e-9, stderr
+
+
+def _inproc_runner(xml: Path, xform: Path) -> Callable[[], tuple[float, str]]:
+    """Parse the template once and time only XML parsing + evaluation per run."""
+    if str(ROOT) not in sys.path:
+        sys.path.insert(0, str(ROOT))
+    from zopyx.xform.eval import eval_module
+    from zopyx.xform.parser import Parser
+    from zopyx.xform.xmlmodel import parse_xml, serialize
+
+    module = Parser(xform.read_text(encoding="utf-8")).parse_module()
+    xml_text = xml.read_text(encoding="utf-8")
+
+    def run() -> tuple[float, str]:
+        start = time.perf_counter_ns()
+        result = eval_module(module, parse_xml(xml_text))
+        output = "".join(serialize(item) if hasattr(item, "kind") else str(item) for item in result)
+        end = time.perf_counter_ns()
+        if "<report" not in output:
+            raise RuntimeError("Unexpected output (missing <report>)")
+        return (end - start) * 1e-9, ""
+
+    return run
+
+
+def _worker_runner(xml: Path, xform: Path, stack: ExitStack) -> Callable[[], tuple[float, str]]:
+    """Send each run to one long-lived Python worker, excluding interpreter startup."""
+    proc = stack.enter_context(
+        subprocess.Popen(
+            [sys.executable, str(WORKER_SCRIPT)],
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            text=True,
+        )
+    )
+    job = f"{xml}\t{xform}\t<report\n"
+
+    def run() -> tuple[float, str]:
+        proc.stdin.write(job)
+        proc.stdin.flush()
+        reply = proc.stdout.readline().strip()
+        if not reply or reply.startswith("ERROR"):
+            raise RuntimeError(reply or "XForm worker exited")
+        return float(reply), ""
+
+    return run
+
+
+def _measure(run: Callable[[], tuple[float, str]]) -> tuple[list[float], list[str]]:
+    times: list[float] = []
+    timing_lines: list[str] = []
+    for _ in range(RUNS):
+        elapsed, timing_line = run()
+        if timing_line:
+            timing_lines.append(timing_line)
+        times.append(elapsed)
+    return times, timing_lines
 
 
 def main() -> int:
-    with tempfile.TemporaryDirectory() as tmpdir:
+    with tempfile.TemporaryDirectory() as tmpdir, ExitStack() as stack:
         tmp = Path(tmpdir)
         xml = tmp / "input.xml"
         xform = tmp / "transform.xform"
@@ -114,23 +175,44 @@ def main() -> int:
         print(f"Items: {ITEMS}, Groups: {GROUPS}, Runs: {RUNS}, Warmup: {WARMUP}")
         print("")
 
-        results: list[tuple[str, float]] = []
+        args = [str(xml), str(xform)]
+        prefixes = {lang: _cmd_prefix(lang) for lang in LANGS}
+        runners: dict[str, Callable[[], tuple[float, str]]] = {}
         for lang in LANGS:
-            cmd = _cmd_for(lang, xml, xform)
-            if not cmd:
-                print(f"{lang:7} SKIP (binary not found)")
-                continue
-            # warmup
+            if lang == "python" and INPROC:
+                run = _inproc_runner(xml, xform)
+            elif lang == "python" and WORKER:
+                run = _worker_runner(xml, xform, stack)
+            else:
+                prefix = prefixes[lang]
+                if prefix is None:
+                    print(f"{lang:7} SKIP (binary not found)")
+                    continue
+                cmd = prefix + args
+                if lang == "python" and COMPILED:
+                    cmd += ["--compiled", str(xform.with_suffix(".xformc"))]
+                    _run_cmd(cmd)  # writes the compiled template, untimed
+                run = partial(_run_cmd, cmd)
+            # warmup (always serial, primes the page cache)
             for _ in range(WARMUP):
-                _, timing_line = _run_cmd(cmd)
-                if timing_line:
-                    print(f"{lang:7} {timing_line}")
-            times = []
-            for _ in range(RUNS):
-                elapsed, timing_line = _run_cmd(cmd)
+                _, timing_line = run()
                 if timing_line:
                     print(f"{lang:7} {timing_line}")
-                times.append(elapsed)
+            runners[lang] = run
+
+        if PARALLEL and runners:
+            # Languages run concurrently; each language's runs stay serial.
+            workers = min(len(runners), os.cpu_count() or 1)
+            with ThreadPoolExecutor(max_workers=workers) as pool:
+                futures = {lang: pool.submit(_measure, run) for lang, run in runners.items()}
+                measured = {lang: fut.result() for lang, fut in futures.items()}
+        else:
+            measured = {lang: _measure(run) for lang, run in runners.items()}
+
+        results: list[tuple[str, float]] = []
+        for lang, (times, timing_lines) in measured.items():
+            for timing_line in timing_lines:
+                print(f"{lang:7} {timing_line}")
             med = median(times)
             results.append((lang, med))
             print(f"{lang:7} median {med:.4f}s (runs: {', '.join(f'{t:.4f}' for t in times)})")
@@ -1,6 +1,8 @@
 from __future__ import annotations
 
+import os
 import subprocess
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 import xml.etree.ElementTree as ET
 
@@ -8,25 +10,33 @@ ROOT = Path(__file__).resolve().parents[1]
 FIXTURES = ROOT / "tests" / "fixtures"
 PYTHON = ROOT / ".venv" / "bin" / "python"
 
+try:  # optional: lxml parses and serializes in C
+    from lxml import etree
+except ImportError:  # pragma: no cover - depends on the environment
+    etree = None
+    _LXML_PARSER = None
+else:
+    _LXML_PARSER = etree.XMLParser(remove_blank_text=True)
 
-def run_xslt(xslt: Path, xml: Path) -> str:
+
+def run_xslt(xslt: Path, xml: bytes) -> str:
     result = subprocess.run(
-        ["xsltproc", str(xslt), str(xml)],
+        ["xsltproc", str(xslt), "-"],
+        input=xml,
         check=True,
         capture_output=True,
-        text=True,
     )
-    return result.stdout.strip()
+    return result.stdout.decode("utf-8").strip()
 
 
-def run_xform(xform: Path, xml: Path) -> str:
+def run_xform(xform: Path, xml: bytes) -> str:
     result = subprocess.run(
-        [str(PYTHON), "-m", "xform.cli", str(xml), str(xform)],
+        [str(PYTHON), "-m", "xform.cli", "-", str(xform)],
+        input=xml,
         check=True,
         capture_output=True,
-        text=True,
     )
-    return result.stdout.strip()
+    return result.stdout.decode("utf-8").strip()
 
 
 def normalize_xml(text: str) -> str:
@@ -34,45 +44,60 @@ def normalize_xml(text: str) -> str:
     if stripped.startswith("<?xml"):
         stripped = stripped.split("?>", 1)[1]
     wrapped = f"<_root>{stripped}</_root>"
+    if etree is not None:
+        root = etree.fromstring(wrapped.encode("utf-8"), _LXML_PARSER)
+        _strip_ws(root)
+        return etree.tostring(root, encoding="unicode")
     root = ET.fromstring(wrapped)
     _strip_ws(root)
-    if root.text is not None:
-        root.text = root.text.lstrip()
     return ET.tostring(root, encoding="unicode")
 
 
-def _strip_ws(elem: ET.Element) -> None:
-    if elem.text is not None and elem.text.strip() == "":
-        elem.text = ""
-    if elem.tail is not None and elem.tail.strip() == "":
-        elem.tail = ""
-    for child in list(elem):
-        _strip_ws(child)
+def _strip_ws(root: ET.Element) -> None:
+    if root.text is not None:
+        root.text = root.text.lstrip()
+    stack = [root]
+    while stack:
+        elem = stack.pop()
+        if elem.text is not None and elem.text.strip() == "":
+            elem.text = ""
+        if elem.tail is not None and elem.tail.strip() == "":
+            elem.tail = ""
+        stack.extend(elem)
+
+
+def _check(case: Path) -> list[str]:
+    xml = (case / "input.xml").read_bytes()
+    xform = case / "transform.xform"
+    xslt = case / "transform.xsl"
+    expected = case / "expected.xml"
+
+    xslt_out = run_xslt(xslt, xml)
+    xform_out = run_xform(xform, xml)
+
+    if expected.exists():
+        expected_out = expected.read_text(encoding="utf-8").strip()
+    else:
+        expected_out = xslt_out
+
+    problems: list[str] = []
+    if normalize_xml(xslt_out) != normalize_xml(expected_out):
+        problems.append(f"{case.name}: XSLT output differs from expected")
+    if normalize_xml(xform_out) != normalize_xml(xslt_out):
+        problems.append(f"{case.name}: XForm output differs from XSLT")
+    return problems
 
 
 def main() -> int:
     cases = sorted(p for p in FIXTURES.iterdir() if p.is_dir())
     ok = True
-    for case in cases:
-        xml = case / "input.xml"
-        xform = case / "transform.xform"
-        xslt = case / "transform.xsl"
-        expected = case / "expected.xml"
-
-        xslt_out = run_xslt(xslt, xml)
-        xform_out = run_xform(xform, xml)
-
-        if expected.exists():
-            expected_out = expected.read_text(encoding="utf-8").strip()
-        else:
-            expected_out = xslt_out
-
-        if normalize_xml(xslt_out) != normalize_xml(expected_out):
-            print(f"{case.name}: XSLT output differs from expected")
-            ok = False
-        if normalize_xml(xform_out) != normalize_xml(xslt_out):
-            print(f"{case.name}: XForm output differs from XSLT")
-            ok = False
+    # Each case spends its time in xsltproc/xform child processes, so threads
+    # are enough to overlap them; map() keeps the report in case order.
+    with ThreadPoolExecutor(max_workers=os.cpu_count()) as pool:
+        for problems in pool.map(_check, cases):
+            for problem in problems:
+                print(problem)
+                ok = False
     return 0 if ok else 1
 
 
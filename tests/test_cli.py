@@ -1,5 +1,8 @@
 from __future__ import annotations
 
+import io
+import os
+import subprocess
 import sys
 from pathlib import Path
 
@@ -12,13 +15,113 @@ def test_cli_main_outputs_transformation(tmp_path: Path, capsys) -> None:
     xml_path.write_text("<root/>", encoding="utf-8")
     xform_path.write_text("xform version '2.0'; <out>{'ok'}</out>", encoding="utf-8")
 
-    argv = ["xform", str(xml_path), str(xform_path)]
-    original_argv = sys.argv
-    try:
-        sys.argv = argv
-        cli.main()
-    finally:
-        sys.argv = original_argv
+    cli.main([str(xml_path), str(xform_path)])
 
     out = capsys.readouterr().out.strip()
     assert out == "<out>ok</out>"
+
+
+def test_cli_main_reads_input_from_stdin(tmp_path: Path, capsys, monkeypatch) -> None:
+    xform_path = tmp_path / "transform.xform"
+    xform_path.write_text("xform version '2.0'; <out>{name(/*)}</out>", encoding="utf-8")
+    monkeypatch.setattr(sys, "stdin", io.TextIOWrapper(io.BytesIO("<r\u00e9/>".encode("utf-8"))))
+
+    cli.main(["-", str(xform_path)])
+
+    out = capsys.readouterr().out.strip()
+    assert out == "<out>r\u00e9</out>"
+
+
+def test_cli_main_reuses_compiled_template(tmp_path: Path, capsys, monkeypatch) -> None:
+    xml_path = tmp_path / "input.xml"
+    xform_path = tmp_path / "transform.xform"
+    compiled_path = tmp_path / "transform.xformc"
+    xml_path.write_text("<root/>", encoding="utf-8")
+    xform_path.write_text("xform version '2.0'; <out>{'ok'}</out>", encoding="utf-8")
+    argv = [str(xml_path), str(xform_path), "--compiled", str(compiled_path)]
+
+    cli.main(argv)
+    assert compiled_path.exists()
+    # Unchanged source: served from the pickle without parsing.
+    with monkeypatch.context() as m:
+        m.setattr(cli, "parse_source", None)
+        cli.main(argv)
+    # Changed source is reparsed even when the pickle is newer.
+    xform_path.write_text("xform version '2.0'; <out>{'new'}</out>", encoding="utf-8")
+    os.utime(xform_path, (0, 0))
+    cli.main(argv)
+    # So is a pickle written by another parser version.
+    parsed = []
+    parse_source = cli.parse_source
+    monkeypatch.setattr(cli, "parse_source", lambda source: parsed.append(source) or parse_source(source))
+    monkeypatch.setattr(cli, "_cache_key", lambda source: "other")
+    cli.main(argv)
+    assert len(parsed) == 1
+
+    out = capsys.readouterr().out.split()
+    assert out == ["<out>ok</out>", "<out>ok</out>", "<out>new</out>", "<out>new</out>"]
+
+
+def test_cli_main_rebuilds_corrupt_compiled_template(tmp_path: Path, capsys) -> None:
+    xml_path = tmp_path / "input.xml"
+    xform_path = tmp_path / "transform.xform"
+    compiled_path = tmp_path / "transform.xformc"
+    xml_path.write_text("<root/>", encoding="utf-8")
+    xform_path.write_text("xform version '2.0'; <out>{'ok'}</out>", encoding="utf-8")
+    argv = [str(xml_path), str(xform_path), "--compiled", str(compiled_path)]
+
+    for garbage in (b"", b"not a pickle", b"\x80\x05\x95"):
+        compiled_path.write_bytes(garbage)
+        cli.main(argv)
+        assert compiled_path.read_bytes() != garbage
+
+    out = capsys.readouterr().out.split()
+    assert out == ["<out>ok</out>"] * 3
+
+
+def test_cli_main_caches_modules_by_source(tmp_path: Path, capsys, monkeypatch) -> None:
+    xml_path = tmp_path / "input.xml"
+    xml_path.write_text("<root/>", encoding="utf-8")
+    cache_dir = tmp_path / "cache"
+    for name in ("a.xform", "b.xform"):
+        (tmp_path / name).write_text("xform version '2.0'; <out>{'ok'}</out>", encoding="utf-8")
+
+    cli.main([str(xml_path), str(tmp_path / "a.xform"), "--cache-dir", str(cache_dir)])
+    assert len(list(cache_dir.glob("*.pickle"))) == 1
+    # Same source under another name: served from the cache without parsing.
+    monkeypatch.setattr(cli, "parse_source", None)
+    monkeypatch.setenv("XFORM_CACHE_DIR", str(cache_dir))
+    cli.main([str(xml_path), str(tmp_path / "b.xform")])
+
+    out = capsys.readouterr().out.split()
+    assert out == ["<out>ok</out>", "<out>ok</out>"]
+
+
+def test_cli_main_overwrites_corrupt_cache_entries(tmp_path: Path, capsys) -> None:
+    xml_path = tmp_path / "input.xml"
+    xml_path.write_text("<root/>", encoding="utf-8")
+    xform_path = tmp_path / "transform.xform"
+    xform_path.write_text("xform version '2.0'; <out>{'ok'}</out>", encoding="utf-8")
+    cache_dir = tmp_path / "cache"
+    argv = [str(xml_path), str(xform_path), "--cache-dir", str(cache_dir)]
+
+    cli.main(argv)
+    (entry,) = cache_dir.glob("*.pickle")
+    for garbage in (b"", b"not a pickle"):
+        entry.write_bytes(garbage)
+        cli.main(argv)
+        assert entry.read_bytes() != garbage
+
+    out = capsys.readouterr().out.split()
+    assert out == ["<out>ok</out>"] * 3
+
+
+def test_shim_package_imports_submodules_lazily() -> None:
+    code = (
+        "import sys, xform; "
+        "assert 'zopyx.xform.eval' not in sys.modules; "
+        "assert xform.eval.eval_expr; "
+        "assert 'zopyx.xform.eval' in sys.modules"
+    )
+    root = Path(__file__).resolve().parents[1]
+    subprocess.run([sys.executable, "-c", code], check=True, cwd=root)
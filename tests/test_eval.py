@@ -19,7 +19,8 @@ from zopyx.xform.eval import (
     to_string,
     value_equal,
 )
-from zopyx.xform.xmlmodel import Node
+from zopyx.xform.parser import Parser
+from zopyx.xform.xmlmodel import Node, parse_xml
 
 
 def _doc_with_children() -> Node:
@@ -41,6 +42,29 @@ def test_eval_module_no_expr_returns_empty() -> None:
     assert eval_module(module, doc) == []
 
 
+def test_paths_see_tree_changes_between_evaluations() -> None:
+    doc = parse_xml("<r><a/><b/></r>")
+    count_desc = Parser("count(//a)").parse_module()
+    assert eval_module(count_desc, doc) == [1.0]
+    root = doc.children[0]
+    root.children.append(Node(kind="element", name="a", parent=root))
+    assert eval_module(count_desc, doc) == [2.0]
+    assert eval_module(Parser("count(/r/a)").parse_module(), doc) == [2.0]
+    assert eval_module(Parser("count(/r/*)").parse_module(), doc) == [3.0]
+
+
+def test_child_steps_match_constructed_attribute_children() -> None:
+    doc = parse_xml("<r id='7'><a/></r>")
+    for query in ("let e := <x>{/r/@id}</x> in count(e/*)", "let e := <x>{/r/@id}</x> in count(e/id)"):
+        assert eval_module(Parser(query).parse_module(), doc) == [1.0]
+
+
+def test_descendant_wildcard_matches_constructed_attribute_children() -> None:
+    doc = parse_xml("<r id='7'><a/></r>")
+    query = "let e := <x><y>{/r/@id}</y></x> in count(e//*)"
+    assert eval_module(Parser(query).parse_module(), doc) == [2.0]
+
+
 def test_varref_resolution_order() -> None:
     doc = _doc_with_children()
     ctx = Context(context_item=doc.children[0], variables={"x": [1]}, functions={"f": ast.FunctionDef([], ast.Literal(1))}, rules={})
@@ -65,6 +89,85 @@ def test_if_let_for_and_where_position_last() -> None:
     assert out == [2.0, 3.0, 3.0, 3.0]
 
 
+def test_for_binding_does_not_leak_into_caller_scope() -> None:
+    variables = {"n": ["outer"]}
+    ctx = Context(context_item=None, variables=variables, functions={}, rules={})
+    seq = ast.FuncCall("seq", [ast.Literal(1.0), ast.Literal(2.0)])
+    inner = ast.ForExpr("m", seq, None, ast.FuncCall("seq", [ast.VarRef("n"), ast.VarRef("m")]))
+    expr = ast.ForExpr("n", seq, None, inner)
+    assert eval_expr(expr, ctx) == [1.0, 1.0, 1.0, 2.0, 2.0, 1.0, 2.0, 2.0]
+    assert variables == {"n": ["outer"]}
+
+
+def test_let_binding_is_undone_after_body() -> None:
+    variables = {"x": ["outer"]}
+    ctx = Context(context_item=None, variables=variables, functions={}, rules={})
+    shadow = ast.LetExpr("x", ast.Literal(1.0), ast.LetExpr("y", ast.VarRef("x"), ast.VarRef("y")))
+    assert eval_expr(shadow, ctx) == [1.0]
+    assert variables == {"x": ["outer"]}
+    failing = ast.LetExpr("x", ast.Literal(2.0), ast.FuncCall("nope", []))
+    with pytest.raises(RuntimeError, match="XFST0003"):
+        eval_expr(failing, ctx)
+    assert variables == {"x": ["outer"]}
+
+
+def test_apply_dispatch_keeps_rule_order() -> None:
+    source = """
+    rule main match <a>{x}</a> := 'a';
+    rule main match <b>{x}</b> := 'b';
+    rule main match node() := 'node';
+    rule main match <c>{x}</c> := 'c';
+    rule main match _ := 'other';
+    apply(seq(/r/*, /r/d/text(), 1))
+    """
+    doc = parse_xml("<r><a/><b/><c/><d>t</d></r>")
+    result = eval_module(Parser(source).parse_module(), doc)
+    assert result == ["a", "b", "node", "node", "node", "other"]
+
+
+def test_nested_for_keeps_outer_position() -> None:
+    ctx = Context(context_item=None, variables={}, functions={}, rules={})
+    seq = ast.FuncCall("seq", [ast.Literal("a"), ast.Literal("b")])
+    inner = ast.ForExpr("m", seq, None, ast.FuncCall("position", []))
+    body = ast.FuncCall("seq", [inner, ast.FuncCall("position", []), ast.FuncCall("last", [])])
+    assert eval_expr(ast.ForExpr("n", seq, None, body), ctx) == [1.0, 2.0, 1.0, 2.0, 1.0, 2.0, 2.0, 2.0]
+
+
+def test_for_arithmetic_body_over_long_sequence() -> None:
+    ctx = Context(context_item=None, variables={"k": [10.0]}, functions={}, rules={})
+    seq = ast.FuncCall("seq", [ast.Literal(float(i)) for i in range(10)] + [ast.Literal("2")])
+    body = ast.BinaryOp("+", ast.UnaryOp("-", ast.VarRef("n")), ast.Literal(1.0))
+    assert eval_expr(ast.ForExpr("n", seq, None, body), ctx) == [1.0 - i for i in range(10)] + [-1.0]
+    body = ast.BinaryOp("<", ast.VarRef("n"), ast.VarRef("k"))
+    assert eval_expr(ast.ForExpr("n", seq, None, body), ctx) == [True] * 11
+    body = ast.BinaryOp("div", ast.Literal(1.0), ast.VarRef("n"))
+    with pytest.raises(ZeroDivisionError):
+        eval_expr(ast.ForExpr("n", seq, None, body), ctx)
+
+
+def test_for_numeric_kernel_matches_interpreter() -> None:
+    ctx = Context(context_item=None, variables={}, functions={}, rules={})
+    items = [ast.Literal(float(i)) for i in range(10)] + [ast.Literal("2"), ast.Literal("2.0")]
+    n = ast.VarRef("n")
+    cases = [
+        (None, n),
+        (None, ast.BinaryOp("+", ast.BinaryOp("<", n, ast.Literal(3.0)), ast.BinaryOp("<", n, ast.Literal(5.0)))),
+        (ast.BinaryOp(">", n, ast.Literal(4.0)), ast.BinaryOp("*", n, ast.Literal(2.0))),
+        (ast.BinaryOp("mod", n, ast.Literal(2.0)), ast.UnaryOp("-", n)),
+        (ast.BinaryOp("=", ast.BinaryOp("mod", n, ast.Literal(3.0)), ast.Literal(0.0)), n),
+        (None, ast.BinaryOp("!=", ast.BinaryOp("-", n, ast.Literal(2.0)), ast.Literal(-0.0))),
+        (ast.BinaryOp("=", n, ast.Literal(2.0)), ast.BinaryOp("*", n, ast.Literal(1.0))),
+    ]
+    for where, body in cases:
+        # Short sequences always take the interpreter path.
+        expected = []
+        for chunk in (items[:5], items[5:]):
+            expected += eval_expr(ast.ForExpr("n", ast.FuncCall("seq", chunk), where, body), ctx)
+        result = eval_expr(ast.ForExpr("n", ast.FuncCall("seq", items), where, body), ctx)
+        assert result == expected
+        assert [type(v) for v in result] == [type(v) for v in expected]
+
+
 def test_match_expr_default_and_error() -> None:
     ctx = Context(context_item=None, variables={}, functions={}, rules={})
     target = ast.FuncCall("seq", [ast.Literal("a"), ast.Literal("b")])
@@ -171,6 +274,20 @@ def test_eval_path_comment_and_pi_tests() -> None:
     assert apply_step([root], step, ctx) == [pi]
 
 
+def test_descendant_axes_with_kind_tests() -> None:
+    doc = _doc_with_children()
+    root = doc.children[0]
+    ctx = Context(context_item=root, variables={}, functions={}, rules={})
+    step = ast.PathStep("desc", ast.StepTest("text"), [])
+    assert [n.value for n in apply_step([root], step, ctx)] == ["hi"]
+    step = ast.PathStep("desc_or_self", ast.StepTest("wildcard"), [])
+    assert [n.name for n in apply_step([root], step, ctx)] == ["root", "child", "child", "sub"]
+    attr = Node(kind="attribute", name="id", value="r")
+    assert apply_step([attr], step, ctx) == [attr]
+    step = ast.PathStep("desc", ast.StepTest("pi"), [])
+    assert apply_step([root], step, ctx) == []
+
+
 def test_eval_constructor_and_text_constructor() -> None:
     ctx = Context(context_item=None, variables={}, functions={}, rules={})
     expr = ast.Constructor(
@@ -183,12 +300,27 @@ def test_eval_constructor_and_text_constructor() -> None:
     assert node.string_value() == "x2y"
 
 
+def test_eval_constructor_adopts_nested_constructors() -> None:
+    ctx = Context(context_item=None, variables={}, functions={}, rules={})
+    inner = ast.Constructor("b", attrs=[], contents=[ast.Text("t")])
+    expr = ast.Constructor("a", attrs=[], contents=[inner, inner])
+    node = eval_constructor(expr, ctx)
+    first, second = node.children
+    assert first is not second
+    assert first.parent is node and second.parent is node
+    assert first.children[0].parent is first
+
+
 def test_unary_ops_and_text_interp() -> None:
     ctx = Context(context_item=None, variables={}, functions={}, rules={})
     assert eval_expr(ast.UnaryOp("-", ast.Literal(2.0)), ctx) == [-2.0]
     assert eval_expr(ast.UnaryOp("not", ast.Literal(True)), ctx) == [False]
     assert eval_expr(ast.Text("hi"), ctx) == ["hi"]
     assert eval_expr(ast.Interp(ast.Literal("x")), ctx) == ["x"]
+    with pytest.raises(RuntimeError, match="Unknown expr"):
+        eval_expr(ast.UnaryOp("?", ast.Literal(1.0)), ctx)
+    with pytest.raises(RuntimeError, match="Unknown expr"):
+        eval_expr(ast.Expr(), ctx)
 
 
 def test_call_function_user_defined_and_defaults() -> None:
@@ -210,6 +342,9 @@ def test_to_boolean_string_number_and_node() -> None:
     assert to_boolean([0]) is False
     assert to_boolean([""]) is False
     assert to_boolean([Node(kind="text", value="x")]) is True
+    assert to_boolean([False, None, 0.0, True]) is True
+    assert to_boolean([False, None]) is False
+    assert to_boolean([{}]) is True
 
 
 def test_to_string_number_boolean_and_node() -> None:
@@ -246,6 +381,7 @@ def test_match_pattern_variants() -> None:
     node.children = [child]
     ok, _ = match_pattern(ast.ElementPattern("a", child=ast.ElementPattern("b")), node)
     assert ok
+    assert match_pattern(ast.Pattern(), node) == (False, {})
 
 
 def test_builtin_helpers() -> None:
@@ -263,6 +399,9 @@ def test_builtin_helpers() -> None:
     assert call_function("attr", [[Node(kind="text", value="x")], ["id"]], ctx) == [""]
     assert call_function("text", [[root], [False]], ctx) == [""]
     assert call_function("text", [["plain"]], ctx) == ["plain"]
+    mixed = parse_xml("<p>a<b>x</b>c</p>").children[0]
+    assert call_function("text", [[mixed], [False]], ctx) == ["ac"]
+    assert call_function("text", [[mixed.children[1]], [False]], ctx) == ["x"]
     assert call_function("children", [[root]], ctx)[0].name == "child"
     assert call_function("elements", [[root], ["child"]], ctx)
     assert call_function("elements", [[Node(kind="text", value="x")]], ctx) == []
@@ -270,6 +409,8 @@ def test_builtin_helpers() -> None:
     assert call_function("count", [[1, 2, 3]], ctx) == [3.0]
     assert call_function("empty", [[]], ctx) == [True]
     assert call_function("distinct", [[1, 1, 2]], ctx) == [1, 2]
+    text = Node(kind="text", value="1")
+    assert call_function("distinct", [[text, 1.0, "1", Node(kind="text", value="1"), "2"]], ctx) == [text, "2"]
     assert call_function("concat", [[1], [2, 3]], ctx) == [1, 2, 3]
     assert call_function("head", [[1, 2]], ctx) == [1]
     assert call_function("tail", [[1, 2]], ctx) == [2]
@@ -278,6 +419,32 @@ def test_builtin_helpers() -> None:
     assert call_function("sum", [[1, 2, 3]], ctx) == [6.0]
 
 
+def test_attr_and_lookup_evaluate_every_argument() -> None:
+    doc = _doc_with_children()
+    root = doc.children[0]
+    ctx = Context(context_item=root, variables={}, functions={}, rules={})
+    failing = ast.FuncCall("nope", [])
+    assert eval_expr(ast.FuncCall("attr", [ast.PathExpr(ast.make_path_start("context"), []), ast.Literal("id")]), ctx) == ["r"]
+    # Errors in later arguments surface even when the first argument
+    # already decides the result.
+    with pytest.raises(RuntimeError, match="XFST0003"):
+        eval_expr(ast.FuncCall("attr", [ast.Literal("x"), failing]), ctx)
+    with pytest.raises(RuntimeError, match="XFST0003"):
+        eval_expr(ast.FuncCall("lookup", [ast.FuncCall("seq", []), failing]), ctx)
+    with pytest.raises(RuntimeError, match="XFST0003"):
+        eval_expr(ast.FuncCall("attr", [ast.PathExpr(ast.make_path_start("context"), []), failing]), ctx)
+
+
+def test_unary_builtins_match_dispatch_and_respect_user_functions() -> None:
+    ctx = Context(context_item=None, variables={"xs": [1.0, "a"]}, functions={}, rules={})
+    for name in ("count", "empty", "string", "number", "boolean"):
+        for arg in (ast.VarRef("xs"), ast.FuncCall("seq", [])):
+            direct = eval_expr(ast.FuncCall(name, [arg]), ctx)
+            assert direct == call_function(name, [eval_expr(arg, ctx)], ctx)
+    shadow = Context(context_item=None, variables={}, functions={"count": ast.FunctionDef([ast.Param("x")], ast.Literal("mine"))}, rules={})
+    assert eval_expr(ast.FuncCall("count", [ast.Literal(1.0)]), shadow) == ["mine"]
+
+
 def test_sort_index_groupby_lookup_and_apply() -> None:
     func = ast.FunctionDef([ast.Param("x")], ast.VarRef("x"))
     rule = ast.RuleDef(ast.ElementPattern("child"), ast.Literal("ok"))
@@ -294,6 +461,18 @@ def test_sort_index_groupby_lookup_and_apply() -> None:
     assert call_function("apply", [doc.children[0].children], ctx) == ["ok", "ok"]
 
 
+def test_key_functions_with_defaults_and_builtins() -> None:
+    neg = ast.BinaryOp("*", ast.VarRef("x"), ast.VarRef("sign"))
+    func = ast.FunctionDef([ast.Param("x"), ast.Param("sign", default=ast.Literal(-1.0))], neg)
+    ctx = Context(context_item=None, variables={}, functions={"neg": func}, rules={})
+    assert eval_expr(ast.VarRef("neg"), ctx) == [FunctionRef("neg")]
+    assert eval_expr(ast.VarRef("neg"), ctx)[0] is eval_expr(ast.VarRef("neg"), ctx)[0]
+    assert call_function("sort", [[1.0, 3.0, 2.0], [FunctionRef("neg")]], ctx) == [1.0, 2.0, 3.0]
+    grouped = call_function("groupBy", [["a", "bb", "cc"], [FunctionRef("string")]], ctx)
+    assert [g["key"] for g in grouped] == ["a", "bb", "cc"]
+    assert call_function("index", [[], [FunctionRef("missing")]], ctx) == [{}]
+
+
 def test_apply_raises_when_no_rule_matches() -> None:
     doc = _doc_with_children()
     ctx = Context(context_item=doc, variables={}, functions={}, rules={"main": []})
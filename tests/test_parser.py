@@ -2,7 +2,7 @@ from __future__ import annotations
 
 import pytest
 
-from zopyx.xform.parser import Lexer, Parser
+from zopyx.xform.parser import Lexer, Parser, _parse_source_cached, parse_source
 from zopyx.xform import ast
 
 
@@ -22,12 +22,69 @@ def test_lexer_string_escapes_and_numbers() -> None:
     assert lexer.next().value == "12.5"
 
 
+def test_lexer_string_escape_semantics() -> None:
+    lexer = Lexer("'\\q\\'\\\\ \\t' \"\\u00e9 €\"")
+    assert lexer.next().value == "q'\\ \t"
+    assert lexer.next().value == "\u00e9 \u20ac"
+
+
 def test_lexer_unterminated_string_raises() -> None:
     lexer = Lexer("'nope")
     with pytest.raises(SyntaxError):
         lexer.next()
 
 
+def test_lexer_comment_runs_to_end_of_line() -> None:
+    lexer = Lexer("# it's @ here\n'open")
+    with pytest.raises(SyntaxError, match="Unterminated string at 14"):
+        lexer.next()
+
+
+def test_lexer_qname_and_operator_tokens() -> None:
+    lexer = Lexer("ex:a-b :=.//x<=y")
+    tokens = []
+    while (tok := lexer.next()).kind != "EOF":
+        tokens.append((tok.kind, tok.value))
+    assert tokens == [
+        ("IDENT", "ex:a-b"),
+        ("OP", ":="),
+        ("DOT", ".//"),
+        ("IDENT", "x"),
+        ("OP", "<="),
+        ("IDENT", "y"),
+    ]
+
+
+def test_lexer_peek_does_not_consume() -> None:
+    lexer = Lexer("text ( )")
+    assert lexer.peek().value == "text"
+    assert lexer.peek().value == "text"
+    assert lexer.next().value == "text"
+    assert lexer.peek().value == "("
+    assert [lexer.next().value for _ in range(2)] == ["(", ")"]
+    assert lexer.next().kind == "EOF"
+
+
+def test_lexer_peek2_does_not_consume() -> None:
+    lexer = Lexer("text { 1 }")
+    assert lexer.peek2().value == "{"
+    assert lexer.peek().value == "text"
+    assert [lexer.next().value for _ in range(2)] == ["text", "{"]
+    assert lexer.peek2().value == "}"
+
+
+def test_lexer_at() -> None:
+    lexer = Lexer("f(1)")
+    assert lexer.at("IDENT", "f")
+    assert not lexer.at("PUNCT", "(")
+    lexer.next()
+    assert lexer.at("PUNCT", "(")
+    kinds = []
+    while (tok := lexer.next()).kind != "EOF":
+        kinds.append(tok.kind)
+    assert kinds == ["PUNCT", "NUMBER", "PUNCT"]
+
+
 def test_lexer_invalid_character_raises() -> None:
     lexer = Lexer("$")
     with pytest.raises(SyntaxError):
@@ -53,6 +110,13 @@ def test_parse_module_with_decls_and_expr() -> None:
     assert isinstance(module.expr, ast.Constructor)
 
 
+def test_parse_call_does_not_depend_on_declarations() -> None:
+    source = "var v := ex:later(1); def ex:later(x) := x; lib:f()"
+    module = Parser(source).parse_module()
+    assert module.vars["v"] == ast.FuncCall("ex:later", [ast.Literal(1.0)])
+    assert module.expr == ast.FuncCall("lib:f", [])
+
+
 def test_parse_version_mismatch_raises() -> None:
     source = "xform version '1.0';"
     with pytest.raises(SyntaxError, match="XFST0005"):
@@ -82,6 +146,13 @@ def test_parse_constructor_contents_and_attributes() -> None:
     assert any(isinstance(c, ast.Interp) for c in expr.contents)
 
 
+def test_parse_constructor_chardata_runs_to_tag_or_brace() -> None:
+    expr = Parser("<a>one text{2} two<b/> three </a>").parse_module().expr
+    assert [c.value for c in expr.contents if isinstance(c, ast.Text)] == ["one text", " two", " three "]
+    with pytest.raises(SyntaxError, match="Unterminated constructor"):
+        Parser("<a>dangling").parse_module()
+
+
 def test_parse_path_variants_and_predicates() -> None:
     source = "xform version '2.0'; /root/child[position()=1]"
     module = Parser(source).parse_module()
@@ -91,6 +162,51 @@ def test_parse_path_variants_and_predicates() -> None:
     assert expr.steps[-1].predicates
 
 
+def test_parse_interns_path_starts_and_step_tests() -> None:
+    first = Parser("/a/b").parse_module().expr
+    second = Parser("/b/a").parse_module().expr
+    assert first.start is second.start
+    assert first.steps[0].test is second.steps[1].test
+    assert Parser("1").parse_module().expr is not ast.make_literal(True)
+    # Interning is bounded, so long-running processes do not grow the caches forever.
+    for make in (ast.make_path_start, ast.make_step_test, ast.make_literal, _parse_source_cached):
+        assert make.cache_info().maxsize is not None
+
+
+def test_parse_folds_constant_arithmetic() -> None:
+    assert Parser("2 * 3 + 1").parse_module().expr == ast.Literal(7.0)
+    assert Parser("-2 < 1").parse_module().expr == ast.Literal(True)
+    assert Parser("1 div 0").parse_module().expr == ast.BinaryOp(
+        "div", ast.Literal(1.0), ast.Literal(0.0)
+    )
+    assert Parser("'1' + 1").parse_module().expr == ast.BinaryOp(
+        "+", ast.Literal("1"), ast.Literal(1.0)
+    )
+    assert Parser("x + 1").parse_module().expr == ast.BinaryOp(
+        "+", ast.VarRef("x"), ast.Literal(1.0)
+    )
+
+
+def test_parse_binary_precedence_and_associativity() -> None:
+    a, b, c, d, e = (ast.VarRef(n) for n in "abcde")
+    expr = Parser("a or b and c = d < e + a * b").parse_module().expr
+    assert expr == ast.BinaryOp(
+        "or",
+        a,
+        ast.BinaryOp(
+            "and",
+            b,
+            ast.BinaryOp(
+                "=",
+                c,
+                ast.BinaryOp("<", d, ast.BinaryOp("+", e, ast.BinaryOp("*", a, b))),
+            ),
+        ),
+    )
+    assert Parser("a - b - c").parse_module().expr == ast.BinaryOp("-", ast.BinaryOp("-", a, b), c)
+    assert Parser("8 div 2 div 2 - -1").parse_module().expr == ast.Literal(3.0)
+
+
 def test_parse_dot_attr_and_desc_or_self() -> None:
     expr = Parser("xform version '2.0'; .@id").parse_module().expr
     assert isinstance(expr, ast.PathExpr)
@@ -144,3 +260,24 @@ def test_parse_invalid_step_test_raises() -> None:
     source = "xform version '2.0'; /?"
     with pytest.raises(SyntaxError):
         Parser(source).parse_module()
+
+
+def test_parse_source_shares_parsed_modules() -> None:
+    source = "def f(x) := x; f(1)"
+    module = parse_source(source)
+    again = parse_source(source)
+    assert again is not module
+    assert again.expr is module.expr
+    assert again.functions["f"] is module.functions["f"]
+    assert module == Parser(source).parse_module()
+    assert parse_source(source + " ").expr is not module.expr
+
+
+def test_parse_source_callers_cannot_change_the_cached_module() -> None:
+    source = "def f(x) := x; rule r match node() := 1; f(1)"
+    module = parse_source(source)
+    module.functions.clear()
+    module.rules["r"].clear()
+    again = parse_source(source)
+    assert set(again.functions) == {"f"}
+    assert len(again.rules["r"]) == 1
@@ -6,9 +6,18 @@ from pathlib import Path
 import shutil
 import sys
 import xml.etree.ElementTree as ET
+from functools import lru_cache
 
 import pytest
 
+try:  # optional: lxml parses and serializes in C
+    from lxml import etree
+except ImportError:  # pragma: no cover - depends on the environment
+    etree = None
+    _LXML_PARSER = None
+else:
+    _LXML_PARSER = etree.XMLParser(remove_blank_text=True)
+
 ROOT = Path(__file__).resolve().parents[1]
 FIXTURES = ROOT / "tests" / "fixtures"
 ENABLED_LANGS = {
@@ -30,6 +39,12 @@ def _run_xslt(xslt: Path, xml: Path) -> str:
     return result.stdout.strip()
 
 
+@lru_cache(maxsize=None)
+def _xslt_output(case: Path) -> str:
+    """Normalized xsltproc output for a fixture, computed once per session."""
+    return _normalize_xml(_run_xslt(case / "transform.xsl", case / "input.xml"))
+
+
 def _run_xform(xform: Path, xml: Path) -> str:
     result = subprocess.run(
         [sys.executable, "-m", "zopyx.xform.cli", str(xml), str(xform)],
@@ -43,22 +58,31 @@ def _run_xform(xform: Path, xml: Path) -> str:
 def _normalize_xml(text: str) -> str:
     stripped = text.lstrip()
     if stripped.startswith("<?xml"):
-        stripped = stripped.split("?>", 1)[1]
-    wrapped = f"<_root>{stripped}</_root>"
-    root = ET.fromstring(wrapped)
+        stripped = stripped[stripped.index("?>") + 2 :]
+    # Feed the fragment between synthetic root tags instead of building a
+    # wrapped copy of the whole output.
+    parser = _LXML_PARSER if etree is not None else ET.XMLParser()
+    parser.feed("<_root>")
+    parser.feed(stripped)
+    parser.feed("</_root>")
+    root = parser.close()
     _strip_ws(root)
     if root.text is not None:
         root.text = root.text.lstrip()
+    if etree is not None:
+        return etree.tostring(root, encoding="unicode")
     return ET.tostring(root, encoding="unicode")
 
 
-def _strip_ws(elem: ET.Element) -> None:
-    if elem.text is not None and elem.text.strip() == "":
-        elem.text = ""
-    if elem.tail is not None and elem.tail.strip() == "":
-        elem.tail = ""
-    for child in list(elem):
-        _strip_ws(child)
+def _strip_ws(root: ET.Element) -> None:
+    stack = [root]
+    while stack:
+        elem = stack.pop()
+        if elem.text is not None and elem.text.strip() == "":
+            elem.text = ""
+        if elem.tail is not None and elem.tail.strip() == "":
+            elem.tail = ""
+        stack.extend(elem)
 
 
 RUST_XFORM_BIN = ROOT / "xform-rs" / "target" / "release" / "xform"
@@ -127,68 +151,26 @@ def _cases():
     return sorted(p for p in FIXTURES.iterdir() if p.is_dir())
 
 
-@pytest.mark.parametrize("case", _cases(), ids=lambda p: p.name)
-def test_xform_matches_xslt(case: Path) -> None:
-    xml = case / "input.xml"
-    xform = case / "transform.xform"
-    xslt = case / "transform.xsl"
-    expected = case / "expected.xml"
-
-    xslt_out = _run_xslt(xslt, xml)
-    xform_out = _run_xform(xform, xml)
-
-    if expected.exists():
-        expected_out = expected.read_text(encoding="utf-8").strip()
-    else:
-        expected_out = xslt_out
-
-    assert _normalize_xml(xslt_out) == _normalize_xml(expected_out)
-    assert _normalize_xml(xform_out) == _normalize_xml(xslt_out)
-
-
-@pytest.mark.parametrize("case", _cases(), ids=lambda p: p.name)
-def test_rust_xform_matches_xslt(case: Path) -> None:
-    xml = case / "input.xml"
-    xform = case / "transform.xform"
-    xslt = case / "transform.xsl"
-
-    xslt_out = _run_xslt(xslt, xml)
-    rust_out = _run_rust_xform(xform, xml)
-
-    assert _normalize_xml(rust_out) == _normalize_xml(xslt_out)
-
-
-@pytest.mark.parametrize("case", _cases(), ids=lambda p: p.name)
-def test_ts_xform_matches_xslt(case: Path) -> None:
-    xml = case / "input.xml"
-    xform = case / "transform.xform"
-    xslt = case / "transform.xsl"
-
-    xslt_out = _run_xslt(xslt, xml)
-    ts_out = _run_ts_xform(xform, xml)
-
-    assert _normalize_xml(ts_out) == _normalize_xml(xslt_out)
+_IMPLEMENTATIONS = {
+    "python": _run_xform,
+    "rust": _run_rust_xform,
+    "ts": _run_ts_xform,
+    "go": _run_go_xform,
+    "swift": _run_swift_xform,
+}
 
 
 @pytest.mark.parametrize("case", _cases(), ids=lambda p: p.name)
-def test_go_xform_matches_xslt(case: Path) -> None:
-    xml = case / "input.xml"
-    xform = case / "transform.xform"
-    xslt = case / "transform.xsl"
-
-    xslt_out = _run_xslt(xslt, xml)
-    go_out = _run_go_xform(xform, xml)
-
-    assert _normalize_xml(go_out) == _normalize_xml(xslt_out)
+def test_xslt_matches_expected(case: Path) -> None:
+    expected = case / "expected.xml"
+    if not expected.exists():
+        pytest.skip("no expected.xml")
+    assert _xslt_output(case) == _normalize_xml(expected.read_text(encoding="utf-8").strip())
 
 
+@pytest.mark.parametrize("lang", sorted(_IMPLEMENTATIONS))
 @pytest.mark.parametrize("case", _cases(), ids=lambda p: p.name)
-def test_swift_xform_matches_xslt(case: Path) -> None:
-    xml = case / "input.xml"
-    xform = case / "transform.xform"
-    xslt = case / "transform.xsl"
-
-    xslt_out = _run_xslt(xslt, xml)
-    swift_out = _run_swift_xform(xform, xml)
-
-    assert _normalize_xml(swift_out) == _normalize_xml(xslt_out)
+def test_implementation_matches_xslt(case: Path, lang: str) -> None:
+    xslt_out = _xslt_output(case)
+    out = _IMPLEMENTATIONS[lang](case / "transform.xform", case / "input.xml")
+    assert _normalize_xml(out) == xslt_out
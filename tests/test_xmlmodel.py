@@ -2,7 +2,10 @@ from __future__ import annotations
 
 from zopyx.xform.xmlmodel import (
     Node,
+    children_named,
     deep_copy,
+    descendants,
+    element_children,
     iter_descendants,
     parse_xml,
     serialize,
@@ -17,6 +20,56 @@ def test_parse_xml_and_string_value() -> None:
     assert doc.string_value() == "hitail"
 
 
+def test_string_value_of_deep_tree() -> None:
+    root = node = Node(kind="element", name="n")
+    for _ in range(5000):
+        child = Node(kind="element", name="n", parent=node)
+        node.children = [child]
+        node = child
+    node.children = [Node(kind="text", value="leaf", parent=node)]
+    assert root.string_value() == "leaf"
+    node.children = [Node(kind="text", value="changed", parent=node)]
+    assert root.string_value() == "changed"
+
+
+def test_parse_xml_deeply_nested_document() -> None:
+    doc = parse_xml("<a>" * 5000 + "x" + "</a>" * 5000)
+    node = doc.children[0]
+    depth = 1
+    while node.children[0].kind == "element":
+        assert node.children[0].parent is node
+        node = node.children[0]
+        depth += 1
+    assert depth == 5000
+    assert node.string_value() == "x"
+    assert serialize(doc) == "<a>" * 5000 + "x" + "</a>" * 5000
+
+
+def test_element_children_skip_text() -> None:
+    doc = parse_xml("<r>a<x/>b<y>c</y></r>")
+    root = doc.children[0]
+    assert [c.name for c in element_children(root)] == ["x", "y"]
+    assert element_children(doc) == [root]
+    assert element_children(root.children[3]) == []
+    built = Node(kind="element", name="b")
+    built.children = [Node(kind="text", value="t", parent=built), Node(kind="element", name="e", parent=built)]
+    assert [c.name for c in element_children(built)] == ["e"]
+    built.children.append(Node(kind="element", name="f", parent=built))
+    assert [c.name for c in element_children(built)] == ["e", "f"]
+
+
+def test_children_named() -> None:
+    doc = parse_xml("<r>" + "".join(f"<n{i % 3} i='{i}'/> " for i in range(30)) + "</r>")
+    root = doc.children[0]
+    found = children_named(root, "n1")
+    assert [c.attrs["i"] for c in found] == [str(i) for i in range(1, 30, 3)]
+    found.clear()
+    assert len(children_named(root, "n1")) == 10
+    assert children_named(root, "missing") == []
+    root.children.append(Node(kind="element", name="n1", parent=root))
+    assert len(children_named(root, "n1")) == 11
+
+
 def test_deep_copy_recurse_false() -> None:
     root = Node(kind="element", name="root")
     child = Node(kind="element", name="child", parent=root)
@@ -25,6 +78,22 @@ def test_deep_copy_recurse_false() -> None:
     assert copied.children == []
 
 
+def test_deep_copy_deeply_nested_tree() -> None:
+    depth = 5000
+    doc = parse_xml("<a x='1'>" * depth + "t" + "</a>" * depth)
+    copied = deep_copy(doc.children[0])
+    assert copied is not doc.children[0]
+    assert copied.attrs == {"x": "1"}
+    assert copied.attrs is not doc.children[0].attrs
+    node = copied
+    for _ in range(depth - 1):
+        (child,) = node.children
+        assert child.parent is node
+        node = child
+    assert node.children[0].value == "t"
+    assert serialize(copied) == serialize(doc.children[0])
+
+
 def test_iter_descendants_order() -> None:
     root = Node(kind="element", name="root")
     a = Node(kind="element", name="a", parent=root)
@@ -34,6 +103,16 @@ def test_iter_descendants_order() -> None:
     b.children = [c]
     names = [n.name for n in iter_descendants(root)]
     assert names == ["a", "b", "c"]
+    assert descendants(root) == list(iter_descendants(root))
+
+
+def test_descendants_see_tree_changes() -> None:
+    doc = parse_xml("<r><a>x</a><b/></r>")
+    root = doc.children[0]
+    assert descendants(doc) == list(iter_descendants(doc))
+    assert [n.name for n in descendants(doc) if n.kind == "element"] == ["r", "a", "b"]
+    root.children.append(Node(kind="element", name="a", parent=root))
+    assert [n.name for n in descendants(doc) if n.kind == "element"] == ["r", "a", "b", "a"]
 
 
 def test_serialize_text_and_attrs() -> None:
@@ -1,5 +1,19 @@
 """Compatibility shim for zopyx.xform."""
 
-from zopyx.xform import __version__, ast, cli, eval, parser, xmlmodel
+import importlib
+
+from zopyx.xform import __version__
 
 __all__ = ["ast", "cli", "eval", "parser", "xmlmodel", "__version__"]
+
+_LAZY = {"ast", "cli", "eval", "parser", "xmlmodel"}
+
+
+def __getattr__(name):
+    # Submodules are imported on first access, so ``python -m xform.cli`` and
+    # ``import xform.parser`` do not pay for the whole package up front.
+    if name in _LAZY:
+        module = importlib.import_module(f"zopyx.xform.{name}")
+        globals()[name] = module
+        return module
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
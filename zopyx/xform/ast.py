@@ -1,10 +1,12 @@
 from __future__ import annotations
 
 from dataclasses import dataclass
-from typing import List, Optional, Tuple
+from functools import lru_cache
+import operator
+from typing import Any, Callable, Dict, List, Optional, Tuple
 
 
-@dataclass
+@dataclass(slots=True, frozen=True)
 class Module:
     functions: dict
     rules: dict
@@ -14,158 +16,273 @@ class Module:
     expr: "Expr | None"
 
 
+# Integer tags the evaluator dispatches on (see eval._EVALUATORS).
+(
+    K_EXPR,
+    K_LITERAL,
+    K_VARREF,
+    K_IF,
+    K_LET,
+    K_FOR,
+    K_MATCH,
+    K_FUNCCALL,
+    K_UNARY,
+    K_BINARY,
+    K_PATH,
+    K_CONSTRUCTOR,
+    K_TEXT_CONSTRUCTOR,
+    K_TEXT,
+    K_INTERP,
+) = range(15)
+
+
 class Expr:
-    pass
+    __slots__ = ()
+    KIND = K_EXPR
 
 
-@dataclass
+@dataclass(slots=True, frozen=True)
 class Literal(Expr):
+    KIND = K_LITERAL
+
     value: object
 
 
-@dataclass
+@dataclass(slots=True, frozen=True)
 class VarRef(Expr):
+    KIND = K_VARREF
+
     name: str
 
 
-@dataclass
+@dataclass(slots=True, frozen=True)
 class IfExpr(Expr):
+    KIND = K_IF
+
     cond: Expr
     then_expr: Expr
     else_expr: Expr
 
 
-@dataclass
+@dataclass(slots=True, frozen=True)
 class LetExpr(Expr):
+    KIND = K_LET
+
     name: str
     value: Expr
     body: Expr
 
 
-@dataclass
+@dataclass(slots=True, frozen=True)
 class ForExpr(Expr):
+    KIND = K_FOR
+
     name: str
     seq: Expr
     where: Optional[Expr]
     body: Expr
 
 
-@dataclass
+@dataclass(slots=True, frozen=True)
 class MatchExpr(Expr):
+    KIND = K_MATCH
+
     target: Expr
     cases: List[Tuple["Pattern", Expr]]
     default: Optional[Expr]
 
 
-@dataclass
+@dataclass(slots=True, frozen=True)
 class FuncCall(Expr):
+    KIND = K_FUNCCALL
+
     name: str
     args: List[Expr]
 
 
-@dataclass
+@dataclass(slots=True, frozen=True)
 class UnaryOp(Expr):
+    KIND = K_UNARY
+
     op: str
     expr: Expr
 
 
-@dataclass
+@dataclass(slots=True, frozen=True)
 class BinaryOp(Expr):
+    KIND = K_BINARY
+
     op: str
     left: Expr
     right: Expr
 
 
-@dataclass
+@dataclass(slots=True, frozen=True)
 class PathExpr(Expr):
+    KIND = K_PATH
+
     start: "PathStart"
     steps: List["PathStep"]
 
 
-@dataclass
+@dataclass(slots=True, frozen=True)
 class Constructor(Expr):
+    KIND = K_CONSTRUCTOR
+
     name: str
     attrs: List[Tuple[str, Expr]]
     contents: List["Content"]
 
 
-@dataclass
+@dataclass(slots=True, frozen=True)
 class TextConstructor(Expr):
+    KIND = K_TEXT_CONSTRUCTOR
+
     expr: Expr
 
 
-@dataclass
+@dataclass(slots=True, frozen=True)
 class Text(Expr):
+    KIND = K_TEXT
+
     value: str
 
 
-@dataclass
+@dataclass(slots=True, frozen=True)
 class Interp(Expr):
+    KIND = K_INTERP
+
     expr: Expr
 
 
 Content = Expr
 
 
-@dataclass
+@dataclass(slots=True, frozen=True)
 class PathStart:
     kind: str  # 'context', 'root', 'desc', 'desc_root', 'var'
     name: Optional[str] = None
 
 
-@dataclass
+# Bounded like make_literal and parse_source: the keys are names taken from
+# module source, so a long-lived process must not collect them forever.
+@lru_cache(maxsize=1024)
+def make_path_start(kind: str, name: Optional[str] = None) -> PathStart:
+    return PathStart(kind, name)
+
+
+@dataclass(slots=True, frozen=True)
 class PathStep:
     axis: str  # 'child', 'desc', 'self', 'parent', 'attr'
     test: "StepTest"
     predicates: List[Expr]
 
 
-@dataclass
+@dataclass(slots=True, frozen=True)
 class StepTest:
     kind: str  # 'name', 'wildcard', 'text', 'node', 'comment', 'pi'
     name: Optional[str] = None
 
 
+@lru_cache(maxsize=1024)
+def make_step_test(kind: str, name: Optional[str] = None) -> StepTest:
+    return StepTest(kind, name)
+
+
+# typed=True keeps Literal(1.0) and Literal(True) apart.
+@lru_cache(maxsize=256, typed=True)
+def make_literal(value: object) -> Literal:
+    return Literal(value)
+
+
+# Numeric operators, shared with the evaluator (eval._NUMERIC_OPS). The
+# parser folds them when both operands are number literals.
+NUMERIC_OPS: Dict[str, Callable[[float, float], Any]] = {
+    "+": operator.add,
+    "-": operator.sub,
+    "*": operator.mul,
+    "div": operator.truediv,
+    "mod": operator.mod,
+    "<": operator.lt,
+    "<=": operator.le,
+    ">": operator.gt,
+    ">=": operator.ge,
+}
+
+
+def make_binary(op: str, left: Expr, right: Expr) -> Expr:
+    fn = NUMERIC_OPS.get(op)
+    if (
+        fn is not None
+        and type(left) is Literal
+        and type(right) is Literal
+        and type(left.value) is float
+        and type(right.value) is float
+        # Division by zero is left to raise at run time.
+        and not (right.value == 0.0 and op in ("div", "mod"))
+    ):
+        # Not interned: make_literal would conflate -0.0 with 0.0.
+        return Literal(fn(left.value, right.value))
+    return BinaryOp(op, left, right)
+
+
+def make_negation(expr: Expr) -> Expr:
+    if type(expr) is Literal and type(expr.value) is float:
+        return Literal(-expr.value)
+    return UnaryOp("-", expr)
+
+
+# Integer tags for patterns (see eval._PATTERN_MATCHERS).
+P_PATTERN, P_WILDCARD, P_ELEMENT, P_TYPED, P_ATTRIBUTE = range(5)
+
+
 class Pattern:
-    pass
+    __slots__ = ()
+    KIND = P_PATTERN
 
 
-@dataclass
+@dataclass(slots=True, frozen=True)
 class WildcardPattern(Pattern):
-    pass
+    KIND = P_WILDCARD
 
 
-@dataclass
+@dataclass(slots=True, frozen=True)
 class ElementPattern(Pattern):
+    KIND = P_ELEMENT
+
     name: str
     var: str | None = None
     child: "Pattern | None" = None
 
 
-@dataclass
+@dataclass(slots=True, frozen=True)
 class TypedPattern(Pattern):
+    KIND = P_TYPED
+
     kind: str  # 'node', 'text', 'comment'
 
 
-@dataclass
+@dataclass(slots=True, frozen=True)
 class AttributePattern(Pattern):
+    KIND = P_ATTRIBUTE
+
     name: str
 
 
-@dataclass
+@dataclass(slots=True, frozen=True)
 class Param:
     name: str
     type_ref: str | None = None
     default: Expr | None = None
 
 
-@dataclass
+@dataclass(slots=True, frozen=True)
 class FunctionDef:
     params: List[Param]
     body: Expr
 
 
-@dataclass
+@dataclass(slots=True, frozen=True)
 class RuleDef:
     pattern: Pattern
     body: Expr
@@ -1,24 +1,119 @@
 from __future__ import annotations
 
 import argparse
+import hashlib
+import os
+import pickle
+import sys
 from pathlib import Path
+from typing import List, Optional
 
-from .parser import Parser
+from . import ast, parser
+from .parser import parse_source
 from .eval import eval_module
 from .xmlmodel import parse_xml, serialize
 
 
-def main() -> None:
+def _cache_key(source: str) -> str:
+    digest = hashlib.blake2b(source.encode("utf-8"), digest_size=16)
+    # A cached module is only valid for the parser and AST classes that built it.
+    for mod in (ast, parser):
+        digest.update(str(os.stat(mod.__file__).st_mtime_ns).encode())
+    return digest.hexdigest()
+
+
+def _dump_module(module: ast.Module, path: Path, key: Optional[str] = None) -> None:
+    tmp = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+    with tmp.open("wb") as fh:
+        if key is not None:
+            pickle.dump(key, fh, protocol=pickle.HIGHEST_PROTOCOL)
+        pickle.dump(module, fh, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(tmp, path)
+
+
+# What pickle.load raises for a truncated or otherwise corrupt file. Such
+# files are treated like missing ones: the module is parsed and rewritten.
+_BAD_PICKLE_ERRORS = (
+    EOFError,
+    pickle.UnpicklingError,
+    AttributeError,
+    ImportError,
+    IndexError,
+    TypeError,
+    ValueError,
+)
+
+
+def _load_compiled(compiled: Path, key: str) -> Optional[ast.Module]:
+    # The key is pickled ahead of the module, so a file written for other
+    # source or by another parser version is rejected before its AST
+    # classes are unpickled.
+    try:
+        with compiled.open("rb") as fh:
+            if pickle.load(fh) != key:
+                return None
+            return pickle.load(fh)
+    except (FileNotFoundError, *_BAD_PICKLE_ERRORS):
+        return None
+
+
+def _load_module(xform: Path, compiled: Optional[Path], cache_dir: Optional[Path] = None) -> ast.Module:
+    source = xform.read_text(encoding="utf-8")
+    key = _cache_key(source)
+    if compiled is not None:
+        module = _load_compiled(compiled, key)
+        if module is not None:
+            return module
+    cached = None
+    if cache_dir is not None:
+        cached = cache_dir / f"{key}.pickle"
+        try:
+            with cached.open("rb") as fh:
+                module = pickle.load(fh)
+        except (FileNotFoundError, *_BAD_PICKLE_ERRORS):
+            # Parsed below and written back over the broken entry.
+            pass
+        else:
+            if compiled is not None:
+                _dump_module(module, compiled, key)
+            return module
+    module = parse_source(source)
+    if compiled is not None:
+        _dump_module(module, compiled, key)
+    if cached is not None:
+        cache_dir.mkdir(parents=True, exist_ok=True)
+        _dump_module(module, cached)
+    return module
+
+
+def main(argv: Optional[List[str]] = None) -> None:
     ap = argparse.ArgumentParser()
-    ap.add_argument("input", help="input XML file")
+    ap.add_argument("input", help="input XML file ('-' reads from stdin)")
     ap.add_argument("xform", help="xform module")
-    args = ap.parse_args()
+    ap.add_argument(
+        "--compiled",
+        metavar="PATH",
+        help="reuse the parsed module pickled at PATH (rewritten if missing or built from other source)",
+    )
+    ap.add_argument(
+        "--cache-dir",
+        metavar="DIR",
+        default=os.environ.get("XFORM_CACHE_DIR"),
+        help="cache parsed modules in DIR, keyed by source hash (default: $XFORM_CACHE_DIR)",
+    )
+    args = ap.parse_args(argv)
 
-    xml_text = Path(args.input).read_text(encoding="utf-8")
-    xform_text = Path(args.xform).read_text(encoding="utf-8")
+    if args.input == "-":
+        xml_text = sys.stdin.buffer.read().decode("utf-8")
+    else:
+        xml_text = Path(args.input).read_text(encoding="utf-8")
 
     doc = parse_xml(xml_text)
-    module = Parser(xform_text).parse_module()
+    module = _load_module(
+        Path(args.xform),
+        Path(args.compiled) if args.compiled else None,
+        Path(args.cache_dir) if args.cache_dir else None,
+    )
     result = eval_module(module, doc)
     output = "".join(serialize(item) if hasattr(item, "kind") else str(item) for item in result)
     print(output)
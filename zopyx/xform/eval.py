@@ -1,15 +1,19 @@
 from __future__ import annotations
 
 from dataclasses import dataclass
-from typing import Any, Callable, Dict, Iterable, List, Optional
+from functools import lru_cache
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Tuple
 
 from . import ast
-from .xmlmodel import Node, deep_copy, iter_descendants, serialize
+from .xmlmodel import Node, children_named, deep_copy, descendants, element_children, serialize
 
 
-@dataclass
+@dataclass(slots=True)
 class Context:
     context_item: Optional[Any]
+    # Evaluation is eager, so contexts may share one variables dict; a new
+    # binding copies it (function calls, match), rebinds a name that only
+    # the current iteration can see (for) or is undone on exit (let).
     variables: Dict[str, List[Any]]
     functions: Dict[str, ast.FunctionDef]
     rules: Dict[str, List[ast.RuleDef]]
@@ -30,188 +34,322 @@ def eval_module(module: ast.Module, doc: Node) -> List[Any]:
 
 
 def eval_expr(expr: ast.Expr, ctx: Context) -> List[Any]:
-    if isinstance(expr, ast.Literal):
-        return [expr.value]
-    if isinstance(expr, ast.VarRef):
-        if expr.name in ctx.variables:
-            return ctx.variables[expr.name]
-        if expr.name in ctx.functions:
-            return [FunctionRef(expr.name)]
-        if isinstance(ctx.context_item, Node):
-            return [
-                child
-                for child in ctx.context_item.children
-                if child.kind == "element" and child.name == expr.name
-            ]
-        return []
-    if isinstance(expr, ast.IfExpr):
-        cond = to_boolean(eval_expr(expr.cond, ctx))
-        return eval_expr(expr.then_expr, ctx) if cond else eval_expr(expr.else_expr, ctx)
-    if isinstance(expr, ast.LetExpr):
-        value = eval_expr(expr.value, ctx)
-        new_vars = dict(ctx.variables)
-        new_vars[expr.name] = value
-        return eval_expr(
-            expr.body,
-            Context(ctx.context_item, new_vars, ctx.functions, ctx.rules, ctx.position, ctx.last),
-        )
-    if isinstance(expr, ast.ForExpr):
-        seq = eval_expr(expr.seq, ctx)
-        out: List[Any] = []
-        total = len(seq)
-        for idx, item in enumerate(seq, start=1):
-            new_vars = dict(ctx.variables)
-            new_vars[expr.name] = [item]
-            new_ctx = Context(
-                context_item=item,
-                variables=new_vars,
-                functions=ctx.functions,
-                rules=ctx.rules,
-                position=idx,
-                last=total,
-            )
-            if expr.where is not None:
-                if not to_boolean(eval_expr(expr.where, new_ctx)):
-                    continue
-            out.extend(eval_expr(expr.body, new_ctx))
-        return out
-    if isinstance(expr, ast.MatchExpr):
-        target_seq = eval_expr(expr.target, ctx)
-        out: List[Any] = []
-        for target in target_seq:
-            matched_any = False
-            for pattern, body in expr.cases:
-                matched, bindings = match_pattern(pattern, target)
-                if matched:
-                    matched_any = True
-                    new_vars = dict(ctx.variables)
-                    new_vars.update(bindings)
-                    out.extend(
-                        eval_expr(
-                            body,
-                            Context(
-                                target,
-                                new_vars,
-                                ctx.functions,
-                                ctx.rules,
-                                ctx.position,
-                                ctx.last,
-                            ),
-                        )
-                    )
-                    break
-            if not matched_any:
-                if expr.default is None:
-                    raise RuntimeError("XFDY0001: no matching case")
-                out.extend(
-                    eval_expr(
-                        expr.default,
-                        Context(
-                            target,
-                            dict(ctx.variables),
-                            ctx.functions,
-                            ctx.rules,
-                            ctx.position,
-                            ctx.last,
-                        ),
-                    )
-                )
-        return out
-    if isinstance(expr, ast.FuncCall):
-        args = [eval_expr(a, ctx) for a in expr.args]
-        return call_function(expr.name, args, ctx)
-    if isinstance(expr, ast.UnaryOp):
-        val = eval_expr(expr.expr, ctx)
-        if expr.op == "-":
-            return [-to_number(val)]
-        if expr.op == "not":
-            return [not to_boolean(val)]
-    if isinstance(expr, ast.BinaryOp):
-        if expr.op == "and":
-            left = eval_expr(expr.left, ctx)
-            if not to_boolean(left):
-                return [False]
-            right = eval_expr(expr.right, ctx)
-            return [to_boolean(right)]
-        if expr.op == "or":
-            left = eval_expr(expr.left, ctx)
-            if to_boolean(left):
-                return [True]
-            right = eval_expr(expr.right, ctx)
-            return [to_boolean(right)]
+    return _EVALUATORS[expr.KIND](expr, ctx)
+
+
+def _eval_unknown(expr: ast.Expr, ctx: Context) -> List[Any]:
+    raise RuntimeError(f"Unknown expr {expr}")
+
+
+def _eval_literal(expr: ast.Literal, ctx: Context) -> List[Any]:
+    return [expr.value]
+
+
+def _eval_var_ref(expr: ast.VarRef, ctx: Context) -> List[Any]:
+    name = expr.name
+    value = ctx.variables.get(name)
+    if value is not None:
+        return value
+    if name in ctx.functions:
+        return [_function_ref(name)]
+    item = ctx.context_item
+    if isinstance(item, Node):
+        return children_named(item, name)
+    return []
+
+
+def _eval_if(expr: ast.IfExpr, ctx: Context) -> List[Any]:
+    cond = to_boolean(eval_expr(expr.cond, ctx))
+    return eval_expr(expr.then_expr, ctx) if cond else eval_expr(expr.else_expr, ctx)
+
+
+def _eval_let(expr: ast.LetExpr, ctx: Context) -> List[Any]:
+    value = eval_expr(expr.value, ctx)
+    # Bound in place for the body only; the previous binding is back before
+    # anything else can read the shared dict.
+    variables = ctx.variables
+    name = expr.name
+    previous = variables.get(name)
+    variables[name] = value
+    try:
+        return eval_expr(expr.body, ctx)
+    finally:
+        if previous is None:
+            del variables[name]
+        else:
+            variables[name] = previous
+
+
+def _eval_for(expr: ast.ForExpr, ctx: Context) -> List[Any]:
+    seq = eval_expr(expr.seq, ctx)
+    where = expr.where
+    if len(seq) >= _KERNEL_MIN_ITEMS:
+        kernel = _numeric_kernel(expr.body, expr.name)
+        if kernel is not None:
+            if where is None:
+                return [kernel(item) for item in seq]
+            keep = _numeric_kernel(where, expr.name)
+            if keep is not None:
+                return [kernel(item) for item in seq if keep(item)]
+    out: List[Any] = []
+    total = len(seq)
+    name, body = expr.name, expr.body
+    functions, rules = ctx.functions, ctx.rules
+    new_vars = dict(ctx.variables)
+    # One context per loop, retargeted per item like the predicate context
+    # in apply_step; nothing keeps hold of it once the body returns.
+    loop_ctx = Context(None, new_vars, functions, rules, None, total)
+    for idx, item in enumerate(seq, start=1):
+        new_vars[name] = [item]
+        loop_ctx.context_item = item
+        loop_ctx.position = idx
+        if where is not None and not to_boolean(eval_expr(where, loop_ctx)):
+            continue
+        out.extend(eval_expr(body, loop_ctx))
+    return out
+
+
+# Loops shorter than this are not worth compiling a kernel for.
+_KERNEL_MIN_ITEMS = 8
+
+_COMPARISON_OPS = frozenset(("<", "<=", ">", ">="))
+
+
+def _numbers_equal(left: float, right: float) -> bool:
+    # = compares string values, and every NaN formats as "nan".
+    return left == right or (left != left and right != right)
+
+
+_EQUALITY_OPS: Dict[str, Callable[[float, float], bool]] = {
+    "=": _numbers_equal,
+    "!=": lambda left, right: not _numbers_equal(left, right),
+}
+
+
+def _numeric_kernel(expr: ast.Expr, name: str) -> Optional[Callable[[Any], Any]]:
+    """Compile an arithmetic body or comparison over the loop variable.
+
+    Only number literals, the loop variable and numeric operators qualify;
+    such a body needs neither a context nor a variables dict per item. The
+    top level must be an operator: a bare loop variable yields the item
+    itself, not its number.
+    """
+    kind = expr.KIND
+    if kind == ast.K_BINARY and expr.op in _EQUALITY_OPS:
+        # = compares string values: fine for computed numbers, but the
+        # loop variable itself must keep its own spelling ("2.0" != 2).
+        if expr.left.KIND == ast.K_VARREF or expr.right.KIND == ast.K_VARREF:
+            return None
+    if kind == ast.K_BINARY and (expr.op in _COMPARISON_OPS or expr.op in _EQUALITY_OPS):
+        fn = _NUMERIC_OPS.get(expr.op) or _EQUALITY_OPS[expr.op]
+        left = _arith_kernel(expr.left, name)
+        right = _arith_kernel(expr.right, name)
+        if left is None or right is None:
+            return None
+        return lambda item: fn(left(item), right(item))
+    if kind == ast.K_BINARY or kind == ast.K_UNARY:
+        return _arith_kernel(expr, name)
+    return None
+
+
+def _arith_kernel(expr: ast.Expr, name: str) -> Optional[Callable[[Any], float]]:
+    # Every closure returns a float. Comparisons are left out: their
+    # booleans would leak into the arithmetic as ints.
+    kind = expr.KIND
+    if kind == ast.K_LITERAL:
+        value = expr.value
+        if type(value) is not float:
+            return None
+        return lambda item: value
+    if kind == ast.K_VARREF:
+        if expr.name != name:
+            return None
+        return _item_number
+    if kind == ast.K_UNARY:
+        operand = _arith_kernel(expr.expr, name) if expr.op == "-" else None
+        if operand is None:
+            return None
+        return lambda item: -operand(item)
+    if kind == ast.K_BINARY:
+        if expr.op in _COMPARISON_OPS:
+            return None
+        fn = _NUMERIC_OPS.get(expr.op)
+        if fn is None:
+            return None
+        left = _arith_kernel(expr.left, name)
+        right = _arith_kernel(expr.right, name)
+        if left is None or right is None:
+            return None
+        return lambda item: fn(left(item), right(item))
+    return None
+
+
+def _eval_match(expr: ast.MatchExpr, ctx: Context) -> List[Any]:
+    target_seq = eval_expr(expr.target, ctx)
+    out: List[Any] = []
+    variables = ctx.variables
+    case_ctx = Context(None, variables, ctx.functions, ctx.rules, ctx.position, ctx.last)
+    cases = expr.cases
+    dispatch = _case_dispatch(cases, len(target_seq))
+    for target in target_seq:
+        case_ctx.context_item = target
+        for pattern, body in cases if dispatch is None else dispatch(target):
+            matched, bindings = match_pattern(pattern, target)
+            if matched:
+                case_ctx.variables = {**variables, **bindings} if bindings else variables
+                out.extend(eval_expr(body, case_ctx))
+                break
+        else:
+            if expr.default is None:
+                raise RuntimeError("XFDY0001: no matching case")
+            case_ctx.variables = variables
+            out.extend(eval_expr(expr.default, case_ctx))
+    return out
+
+
+def _eval_func_call(expr: ast.FuncCall, ctx: Context) -> List[Any]:
+    func = ctx.functions.get(expr.name)
+    if func is not None:
+        return _call_user_function(func, [eval_expr(a, ctx) for a in expr.args], ctx)
+    return _BUILTIN_CALLS.get(expr.name, _call_unknown)(expr, ctx)
+
+
+def _call_unknown(expr: ast.FuncCall, ctx: Context) -> List[Any]:
+    # Arguments are still evaluated first, so their errors take precedence.
+    for arg in expr.args:
+        eval_expr(arg, ctx)
+    raise RuntimeError(f"XFST0003: unknown function {expr.name}")
+
+
+def _eval_unary(expr: ast.UnaryOp, ctx: Context) -> List[Any]:
+    val = eval_expr(expr.expr, ctx)
+    if expr.op == "-":
+        return [-to_number(val)]
+    if expr.op == "not":
+        return [not to_boolean(val)]
+    raise RuntimeError(f"Unknown expr {expr}")
+
+
+def _eval_binary_op(expr: ast.BinaryOp, ctx: Context) -> List[Any]:
+    if expr.op == "and":
         left = eval_expr(expr.left, ctx)
+        if not to_boolean(left):
+            return [False]
         right = eval_expr(expr.right, ctx)
-        return [eval_binary(expr.op, left, right)]
-    if isinstance(expr, ast.PathExpr):
-        return eval_path(expr, ctx)
-    if isinstance(expr, ast.Constructor):
-        return [eval_constructor(expr, ctx)]
-    if isinstance(expr, ast.TextConstructor):
-        return [Node(kind="text", value=to_string(eval_expr(expr.expr, ctx)))]
-    if isinstance(expr, ast.Text):
-        return [expr.value]
-    if isinstance(expr, ast.Interp):
-        return eval_expr(expr.expr, ctx)
-    raise RuntimeError(f"Unknown expr {expr}")
+        return [to_boolean(right)]
+    if expr.op == "or":
+        left = eval_expr(expr.left, ctx)
+        if to_boolean(left):
+            return [True]
+        right = eval_expr(expr.right, ctx)
+        return [to_boolean(right)]
+    left = eval_expr(expr.left, ctx)
+    right = eval_expr(expr.right, ctx)
+    return [eval_binary(expr.op, left, right)]
+
+
+def _eval_path(expr: ast.PathExpr, ctx: Context) -> List[Any]:
+    return eval_path(expr, ctx)
+
+
+def _eval_constructor(expr: ast.Constructor, ctx: Context) -> List[Any]:
+    return [eval_constructor(expr, ctx)]
+
+
+def _eval_text_constructor(expr: ast.TextConstructor, ctx: Context) -> List[Any]:
+    return [Node(kind="text", value=to_string(eval_expr(expr.expr, ctx)))]
+
+
+def _eval_text(expr: ast.Text, ctx: Context) -> List[Any]:
+    return [expr.value]
+
+
+def _eval_interp(expr: ast.Interp, ctx: Context) -> List[Any]:
+    return eval_expr(expr.expr, ctx)
+
+
+# Indexed by the node's KIND tag; order must follow the K_* constants in ast.
+_EVALUATORS: List[Callable[[Any, Context], List[Any]]] = [
+    _eval_unknown,
+    _eval_literal,
+    _eval_var_ref,
+    _eval_if,
+    _eval_let,
+    _eval_for,
+    _eval_match,
+    _eval_func_call,
+    _eval_unary,
+    _eval_binary_op,
+    _eval_path,
+    _eval_constructor,
+    _eval_text_constructor,
+    _eval_text,
+    _eval_interp,
+]
+
+
+# Numeric operators; both operands are converted with to_number first.
+_NUMERIC_OPS = ast.NUMERIC_OPS
 
 
 def eval_binary(op: str, left: List[Any], right: List[Any]) -> Any:
-    if op == "and":
-        return to_boolean(left) and to_boolean(right)
-    if op == "or":
-        return to_boolean(left) or to_boolean(right)
+    fn = _NUMERIC_OPS.get(op)
+    if fn is not None:
+        # Number literals and arithmetic results are already floats.
+        if left and right and type(lnum := left[0]) is float and type(rnum := right[0]) is float:
+            return fn(lnum, rnum)
+        return fn(to_number(left), to_number(right))
     if op == "=":
         return value_equal(left, right)
     if op == "!=":
         return not value_equal(left, right)
-    lnum = to_number(left)
-    rnum = to_number(right)
-    if op == "+":
-        return lnum + rnum
-    if op == "-":
-        return lnum - rnum
-    if op == "*":
-        return lnum * rnum
-    if op == "div":
-        return lnum / rnum
-    if op == "mod":
-        return lnum % rnum
-    if op == "<":
-        return lnum < rnum
-    if op == "<=":
-        return lnum <= rnum
-    if op == ">":
-        return lnum > rnum
-    if op == ">=":
-        return lnum >= rnum
+    if op == "and":
+        return to_boolean(left) and to_boolean(right)
+    if op == "or":
+        return to_boolean(left) or to_boolean(right)
     raise RuntimeError(f"Unknown operator {op}")
 
 
 def eval_path(expr: ast.PathExpr, ctx: Context) -> List[Any]:
-    steps = list(expr.steps)
-    if expr.start.kind == "context":
-        base = [ctx.context_item] if ctx.context_item is not None else []
-    elif expr.start.kind == "root":
-        base = _root_of(ctx.context_item)
-    elif expr.start.kind == "desc":
-        base = [ctx.context_item] if ctx.context_item is not None else []
-    elif expr.start.kind == "desc_root":
-        base = _root_of(ctx.context_item)
-    elif expr.start.kind == "var":
-        if expr.start.name in ctx.variables:
-            base = ctx.variables.get(expr.start.name, [])
-        else:
+    start = expr.start
+    if start.kind == "var":
+        current = ctx.variables.get(start.name)
+        if current is None:
+            # An unbound $name reads as a child step from the context item.
             base = [ctx.context_item] if ctx.context_item is not None else []
-            steps = [ast.PathStep("child", ast.StepTest("name", expr.start.name), [])] + steps
+            current = apply_step(base, _unbound_var_step(start.name), ctx)
     else:
-        base = []
-
-    current = base
-    for step in steps:
+        current = _PATH_BASES.get(start.kind, _no_base)(start, ctx)
+    for step in expr.steps:
         current = apply_step(current, step, ctx)
     return current
 
 
+@lru_cache(maxsize=1024)
+def _unbound_var_step(name: str) -> ast.PathStep:
+    return ast.PathStep("child", ast.make_step_test("name", name), [])
+
+
+def _context_base(start: ast.PathStart, ctx: Context) -> List[Any]:
+    return [ctx.context_item] if ctx.context_item is not None else []
+
+
+def _root_base(start: ast.PathStart, ctx: Context) -> List[Any]:
+    return _root_of(ctx.context_item)
+
+
+def _no_base(start: ast.PathStart, ctx: Context) -> List[Any]:
+    return []
+
+
+_PATH_BASES: Dict[str, Callable[[ast.PathStart, Context], List[Any]]] = {
+    "context": _context_base,
+    "root": _root_base,
+    "desc": _context_base,
+    "desc_root": _root_base,
+}
+
+
 def _root_of(item: Optional[Any]) -> List[Any]:
     if isinstance(item, Node):
         node = item
@@ -221,145 +359,266 @@ def _root_of(item: Optional[Any]) -> List[Any]:
     return []
 
 
-def _desc_or_self(items: List[Any]) -> List[Any]:
-    out: List[Any] = []
-    for item in items:
-        if isinstance(item, Node):
-            out.append(item)
-            out.extend(list(iter_descendants(item)))
-    return out
-
-
 def apply_step(items: List[Any], step: ast.PathStep, ctx: Context) -> List[Any]:
+    test = step.test
+    select = _step_selector(step.axis, test.kind, test.name)
     out: List[Any] = []
+    predicates = step.predicates
+    if not predicates:
+        for item in items:
+            if isinstance(item, Node):
+                out.extend(select(item))
+        return out
+    # Predicates only read the context item, so one context is retargeted
+    # per candidate instead of allocating a new one.
+    pred_ctx = Context(None, ctx.variables, ctx.functions, ctx.rules, ctx.position, ctx.last)
     for item in items:
         if not isinstance(item, Node):
             continue
-        if step.axis == "self":
-            candidates = [item]
-        elif step.axis == "parent":
-            candidates = [item.parent] if item.parent is not None else []
-        elif step.axis == "desc_or_self":
-            candidates = [item]
-            candidates.extend(list(iter_descendants(item)))
-        elif step.axis == "desc":
-            candidates = list(iter_descendants(item))
-        elif step.axis == "attr":
-            if item.kind == "element":
-                if step.test.kind == "name":
-                    name = step.test.name
-                    if name in item.attrs:
-                        candidates = [Node(kind="attribute", name=name, value=item.attrs[name])]
-                    else:
-                        candidates = []
-                elif step.test.kind == "wildcard":
-                    candidates = [
-                        Node(kind="attribute", name=k, value=v)
-                        for k, v in item.attrs.items()
-                    ]
-                else:
-                    candidates = []
+        for cand in select(item):
+            pred_ctx.context_item = cand
+            for pred in predicates:
+                if not to_boolean(eval_expr(pred, pred_ctx)):
+                    break
             else:
-                candidates = []
-        else:
-            candidates = item.children if item.kind in ("element", "document") else []
-
-        matched: List[Any] = []
-        for cand in candidates:
-            if step.axis in ("attr", "self", "parent"):
-                if _matches_test(cand, step.test):
-                    matched.append(cand)
-                continue
-            if _matches_test(cand, step.test):
-                matched.append(cand)
-        for cand in matched:
-            if all(
-                to_boolean(
-                    eval_expr(
-                        pred,
-                        Context(cand, dict(ctx.variables), ctx.functions, ctx.rules, ctx.position, ctx.last),
-                    )
-                )
-                for pred in step.predicates
-            ):
                 out.append(cand)
     return out
 
 
-def _matches_test(node: Node, test: ast.StepTest) -> bool:
-    if test.kind == "node":
-        return True
-    if test.kind == "wildcard":
-        return node.kind in ("element", "attribute")
-    if test.kind == "text":
-        return node.kind == "text"
-    if test.kind == "comment":
-        return node.kind == "comment"
-    if test.kind == "pi":
-        return node.kind == "pi"
+@lru_cache(maxsize=1024)
+def _step_selector(axis: str, kind: str, name: Optional[str]) -> Callable[[Node], Sequence[Any]]:
+    """Specialise an axis and node test into one function of the context node.
+
+    Both are constants of the query, so the branching on them happens once
+    per distinct step rather than once per visited node. The cache is keyed
+    on the test's strings, whose hashes are stored, rather than on the
+    StepTest, whose hash is recomputed on every lookup.
+    """
+    if axis == "attr":
+        if kind == "name":
+            def select(item: Node) -> List[Any]:
+                if item.kind == "element" and name in item.attrs:
+                    return [Node(kind="attribute", name=name, value=item.attrs[name])]
+                return []
+        elif kind == "wildcard":
+            def select(item: Node) -> List[Any]:
+                if item.kind != "element":
+                    return []
+                return [Node(kind="attribute", name=k, value=v) for k, v in item.attrs.items()]
+        else:
+            def select(item: Node) -> List[Any]:
+                return []
+        return select
+
+    if axis == "child" and kind == "name":
+        # The most common step shape (e.g. items/value).
+        def select(item: Node) -> List[Any]:
+            if item.kind == "element" or item.kind == "document":
+                return [c for c in item.children if c.name == name]
+            return []
+        return select
+
+    if axis == "child" and kind == "wildcard":
+        # Constructed elements can hold attribute nodes as children, and
+        # wildcards match those as well (see _node_test).
+        def select(item: Node) -> List[Any]:
+            if item.kind == "element" or item.kind == "document":
+                return [c for c in item.children if c.kind == "element" or c.kind == "attribute"]
+            return []
+        return select
+
+    test = ast.make_step_test(kind, name)
+    if (axis == "desc" or axis == "desc_or_self") and kind != "node":
+        return _descendant_selector(test, axis == "desc_or_self")
+
+    candidates = _AXES.get(axis, _child_axis)
+    if kind == "node":
+        return candidates
+    matches = _node_test(test)
+    return lambda item: [c for c in candidates(item) if matches(c)]
+
+
+def _node_test(test: ast.StepTest) -> Callable[[Node], bool]:
+    kind = test.kind
+    name = test.name
+    if kind == "node":
+        return lambda node: True
+    if kind == "name":
+        return lambda node: node.name == name
+    if kind == "wildcard":
+        return lambda node: node.kind == "element" or node.kind == "attribute"
+    if kind in ("text", "comment", "pi"):
+        return lambda node: node.kind == kind
+    return lambda node: False
+
+
+def _descendant_selector(test: ast.StepTest, with_self: bool) -> Callable[[Node], List[Any]]:
+    """Walk the subtree once, keeping matching nodes (//name, //text(), ...)."""
+    self_matches = _node_test(test)
     if test.kind == "name":
-        return node.name == test.name
-    return False
+        name = test.name
+
+        def select(item: Node) -> List[Any]:
+            out: List[Any] = [item] if with_self and self_matches(item) else []
+            stack = list(reversed(item.children))
+            while stack:
+                node = stack.pop()
+                if node.name == name:
+                    out.append(node)
+                if node.children:
+                    stack.extend(reversed(node.children))
+            return out
+
+        return select
+
+    if test.kind == "wildcard":
+        kinds = ("element", "attribute")
+    elif test.kind in ("text", "comment", "pi"):
+        kinds = (test.kind,)
+    else:
+        return lambda item: [item] if with_self and self_matches(item) else []
+
+    def select(item: Node) -> List[Any]:
+        out: List[Any] = [item] if with_self and self_matches(item) else []
+        stack = list(reversed(item.children))
+        while stack:
+            node = stack.pop()
+            if node.kind in kinds:
+                out.append(node)
+            if node.children:
+                stack.extend(reversed(node.children))
+        return out
+
+    return select
+
+
+def _self_axis(item: Node) -> List[Any]:
+    return [item]
+
+
+def _parent_axis(item: Node) -> List[Any]:
+    return [item.parent] if item.parent is not None else []
+
+
+def _child_axis(item: Node) -> Sequence[Any]:
+    if item.kind == "element" or item.kind == "document":
+        return item.children
+    return ()
+
+
+def _desc_or_self_axis(item: Node) -> List[Any]:
+    out = [item]
+    out.extend(descendants(item))
+    return out
+
+
+_AXES: Dict[str, Callable[[Node], Sequence[Any]]] = {
+    "self": _self_axis,
+    "parent": _parent_axis,
+    "child": _child_axis,
+    "desc": descendants,
+    "desc_or_self": _desc_or_self_axis,
+}
 
 
 def eval_constructor(expr: ast.Constructor, ctx: Context) -> Node:
-    node = Node(kind="element", name=expr.name)
-    for name, aexpr in expr.attrs:
-        val = eval_expr(aexpr, ctx)
-        node.attrs[name] = to_string(val)
+    attrs = {name: to_string(eval_expr(aexpr, ctx)) for name, aexpr in expr.attrs}
+    node = Node(kind="element", name=expr.name, attrs=attrs)
     children: List[Node] = []
     for content in expr.contents:
-        if isinstance(content, ast.Text):
+        kind = content.KIND
+        if kind == ast.K_TEXT:
             children.append(Node(kind="text", value=content.value))
             continue
+        if kind == ast.K_CONSTRUCTOR:
+            # A nested literal element is freshly built, so it is adopted
+            # as is rather than copied once per enclosing level.
+            children.append(eval_constructor(content, ctx))
+            continue
         seq = eval_expr(content, ctx)
         for item in seq:
             if isinstance(item, Node):
                 children.append(deep_copy(item))
             else:
-                children.append(Node(kind="text", value=to_string([item])))
+                children.append(Node(kind="text", value=_item_string(item)))
     for child in children:
         child.parent = node
     node.children = children
     return node
 
 
-@dataclass
+@dataclass(slots=True, frozen=True)
 class FunctionRef:
     name: str
 
 
-def call_function(name: str, args: List[List[Any]], ctx: Context) -> List[Any]:
-    if name in ctx.functions:
-        func = ctx.functions[name]
-        params = func.params
-        body = func.body
-        if len(args) > len(params):
-            raise RuntimeError("XFDY0002: wrong arity")
-        new_vars = dict(ctx.variables)
-        for param, value in zip(params, args):
-            new_vars[param.name] = value
-        if len(args) < len(params):
-            for param in params[len(args) :]:
-                if param.default is None:
-                    raise RuntimeError("XFDY0002: wrong arity")
-                new_vars[param.name] = eval_expr(param.default, ctx)
-        new_ctx = Context(ctx.context_item, new_vars, ctx.functions, ctx.rules, ctx.position, ctx.last)
-        return eval_expr(body, new_ctx)
+# One shared reference per function name, for the names in use.
+_function_ref = lru_cache(maxsize=1024)(FunctionRef)
 
+
+def call_function(name: str, args: List[List[Any]], ctx: Context) -> List[Any]:
+    func = ctx.functions.get(name)
+    if func is not None:
+        return _call_user_function(func, args, ctx)
+    return _call_builtin(name, args, ctx)
+
+
+def _call_user_function(func: ast.FunctionDef, args: List[List[Any]], ctx: Context) -> List[Any]:
+    params = func.params
+    if len(args) > len(params):
+        raise RuntimeError("XFDY0002: wrong arity")
+    new_vars = dict(ctx.variables)
+    for param, value in zip(params, args):
+        new_vars[param.name] = value
+    if len(args) < len(params):
+        for param in params[len(args) :]:
+            if param.default is None:
+                raise RuntimeError("XFDY0002: wrong arity")
+            new_vars[param.name] = eval_expr(param.default, ctx)
+    new_ctx = Context(ctx.context_item, new_vars, ctx.functions, ctx.rules, ctx.position, ctx.last)
+    return eval_expr(func.body, new_ctx)
+
+
+def _call_builtin(name: str, args: List[List[Any]], ctx: Context) -> List[Any]:
     fn = BUILTINS.get(name)
     if fn is None:
         raise RuntimeError(f"XFST0003: unknown function {name}")
     return fn(args, ctx)
 
 
+def _key_caller(name: str, ctx: Context) -> Callable[[Any], List[Any]]:
+    """Resolve a key function once for calling it on every item of a sequence.
+
+    A user function with one required parameter gets a single variables
+    dict and context, rebinding just the parameter per item.
+    """
+    func = ctx.functions.get(name)
+    if func is None or not func.params or any(p.default is None for p in func.params[1:]):
+        return lambda item: call_function(name, [[item]], ctx)
+    new_vars = dict(ctx.variables)
+    for param in func.params[1:]:
+        new_vars[param.name] = eval_expr(param.default, ctx)
+    param_name = func.params[0].name
+    body = func.body
+    call_ctx = Context(ctx.context_item, new_vars, ctx.functions, ctx.rules, ctx.position, ctx.last)
+
+    def call(item: Any) -> List[Any]:
+        new_vars[param_name] = [item]
+        return eval_expr(body, call_ctx)
+
+    return call
+
+
 def to_boolean(seq: List[Any]) -> bool:
-    if not seq:
-        return False
-    if any(isinstance(i, Node) for i in seq):
-        return True
+    # True if any item is a node or a truthy value; one pass, usually
+    # decided by the first item. Booleans (comparisons, predicates) are
+    # settled by identity before the general check.
     for item in seq:
-        if item not in (False, 0, 0.0, "", None):
+        if item is True:
+            return True
+        if item is False:
+            continue
+        if isinstance(item, Node) or item not in (0.0, "", None):
             return True
     return False
 
@@ -367,24 +626,39 @@ def to_boolean(seq: List[Any]) -> bool:
 def to_string(seq: List[Any]) -> str:
     if not seq:
         return ""
-    item = seq[0]
-    if isinstance(item, Node):
+    return _item_string(seq[0])
+
+
+def _item_string(item: Any) -> str:
+    # to_string of a single item, without wrapping it in a list; also the
+    # key used by distinct, sort, index and group-by. Exact-type checks
+    # settle the common item types; bool cannot be subclassed and Node never
+    # is, so only float subclasses reach the isinstance fallback.
+    cls = type(item)
+    if cls is Node:
         return item.string_value()
+    if cls is str:
+        return item
+    if cls is float:
+        return str(int(item)) if item.is_integer() else str(item)
     if item is None:
         return ""
-    if isinstance(item, bool):
+    if cls is bool:
         return "true" if item else "false"
     if isinstance(item, float):
-        if item.is_integer():
-            return str(int(item))
-        return str(item)
+        return str(int(item)) if item.is_integer() else str(item)
     return str(item)
 
 
 def to_number(seq: List[Any]) -> float:
     if not seq:
         return 0.0
-    item = seq[0]
+    return _item_number(seq[0])
+
+
+def _item_number(item: Any) -> float:
+    if type(item) is float:
+        return item
     if isinstance(item, Node):
         item = item.string_value()
     if isinstance(item, bool):
@@ -399,41 +673,101 @@ def value_equal(left: List[Any], right: List[Any]) -> bool:
     return to_string(left) == to_string(right)
 
 
+# Fewer cases, or fewer items to match them against, than this are
+# scanned in order without building a dispatch table.
+_DISPATCH_MIN_CASES = 4
+_DISPATCH_MIN_ITEMS = 2
+
+
+def _case_dispatch(
+    cases: Sequence[Tuple[ast.Pattern, ast.Expr]], items: int
+) -> Optional[Callable[[Any], Sequence[Tuple[ast.Pattern, ast.Expr]]]]:
+    """Map an item to the cases worth trying on it, in declaration order.
+
+    An element can only match element patterns with its own name, so the
+    others are left out for it; every other pattern kind is kept. None
+    means the cases are best scanned as they are.
+    """
+    if len(cases) < _DISPATCH_MIN_CASES or items < _DISPATCH_MIN_ITEMS:
+        return None
+    by_name: Dict[str, List[Tuple[ast.Pattern, ast.Expr]]] = {
+        pattern.name: [] for pattern, _ in cases if pattern.KIND == ast.P_ELEMENT
+    }
+    others: List[Tuple[ast.Pattern, ast.Expr]] = []
+    for case in cases:
+        pattern = case[0]
+        if pattern.KIND == ast.P_ELEMENT:
+            by_name[pattern.name].append(case)
+        else:
+            others.append(case)
+            for named in by_name.values():
+                named.append(case)
+
+    def candidates(item: Any) -> Sequence[Tuple[ast.Pattern, ast.Expr]]:
+        if isinstance(item, Node) and item.kind == "element":
+            return by_name.get(item.name, others)
+        return others
+
+    return candidates
+
+
 def match_pattern(pattern: ast.Pattern, item: Any) -> tuple[bool, Dict[str, List[Any]]]:
-    if isinstance(pattern, ast.WildcardPattern):
-        return True, {}
-    if isinstance(pattern, ast.AttributePattern):
-        if isinstance(item, Node) and item.kind == "attribute" and item.name == pattern.name:
-            return True, {}
-        return False, {}
-    if isinstance(pattern, ast.TypedPattern):
-        if item is None:
+    return _PATTERN_MATCHERS[pattern.KIND](pattern, item)
+
+
+def _match_unknown(pattern: ast.Pattern, item: Any) -> tuple[bool, Dict[str, List[Any]]]:
+    return False, {}
+
+
+def _match_wildcard(pattern: ast.WildcardPattern, item: Any) -> tuple[bool, Dict[str, List[Any]]]:
+    return True, {}
+
+
+def _match_element(pattern: ast.ElementPattern, item: Any) -> tuple[bool, Dict[str, List[Any]]]:
+    if isinstance(item, Node) and item.kind == "element" and item.name == pattern.name:
+        bindings: Dict[str, List[Any]] = {}
+        if pattern.var is not None:
+            bindings[pattern.var] = list(item.children)
+            return True, bindings
+        if pattern.child is not None:
+            for child in item.children:
+                matched, child_bindings = match_pattern(pattern.child, child)
+                if matched:
+                    bindings.update(child_bindings)
+                    return True, bindings
             return False, {}
-        if pattern.kind == "node":
-            return isinstance(item, Node), {}
-        if pattern.kind == "text":
-            return isinstance(item, Node) and item.kind == "text", {}
-        if pattern.kind == "comment":
-            return isinstance(item, Node) and item.kind == "comment", {}
-        return False, {}
-    if isinstance(pattern, ast.ElementPattern):
-        if isinstance(item, Node) and item.kind == "element" and item.name == pattern.name:
-            bindings: Dict[str, List[Any]] = {}
-            if pattern.var is not None:
-                bindings[pattern.var] = list(item.children)
-                return True, bindings
-            if pattern.child is not None:
-                for child in item.children:
-                    matched, child_bindings = match_pattern(pattern.child, child)
-                    if matched:
-                        bindings.update(child_bindings)
-                        return True, bindings
-                return False, {}
-            return True, {}
+        return True, {}
+    return False, {}
+
+
+def _match_typed(pattern: ast.TypedPattern, item: Any) -> tuple[bool, Dict[str, List[Any]]]:
+    if item is None:
         return False, {}
+    if pattern.kind == "node":
+        return isinstance(item, Node), {}
+    if pattern.kind == "text":
+        return isinstance(item, Node) and item.kind == "text", {}
+    if pattern.kind == "comment":
+        return isinstance(item, Node) and item.kind == "comment", {}
+    return False, {}
+
+
+def _match_attribute(pattern: ast.AttributePattern, item: Any) -> tuple[bool, Dict[str, List[Any]]]:
+    if isinstance(item, Node) and item.kind == "attribute" and item.name == pattern.name:
+        return True, {}
     return False, {}
 
 
+# Indexed by the pattern's KIND tag; order must follow the P_* constants in ast.
+_PATTERN_MATCHERS: List[Callable[[Any, Any], tuple[bool, Dict[str, List[Any]]]]] = [
+    _match_unknown,
+    _match_wildcard,
+    _match_element,
+    _match_typed,
+    _match_attribute,
+]
+
+
 # Built-in functions
 
 def _fn_string(args: List[List[Any]], ctx: Context) -> List[Any]:
@@ -497,12 +831,11 @@ def _fn_text(args: List[List[Any]], ctx: Context) -> List[Any]:
         if deep:
             return [node.string_value()]
         if node.kind in ("element", "document"):
-            direct = "".join(
-                child.value or ""
-                for child in node.children
-                if isinstance(child, Node) and child.kind == "text"
-            )
-            return [direct]
+            children = node.children
+            if len(children) == 1 and children[0].kind == "text":
+                # Text-only leaves, the common case, need no join.
+                return [children[0].value or ""]
+            return ["".join([child.value or "" for child in children if child.kind == "text"])]
         return [node.string_value()]
     return [to_string(args[0])]
 
@@ -523,10 +856,9 @@ def _fn_elements(args: List[List[Any]], ctx: Context) -> List[Any]:
     if not isinstance(node, Node) or node.kind not in ("element", "document"):
         return []
     name_test = to_string(args[1]) if len(args) > 1 else None
-    out = [c for c in node.children if isinstance(c, Node) and c.kind == "element"]
     if name_test:
-        out = [c for c in out if c.name == name_test]
-    return out
+        return children_named(node, name_test)
+    return element_children(node)
 
 
 def _fn_copy(args: List[List[Any]], ctx: Context) -> List[Any]:
@@ -542,11 +874,11 @@ def _fn_copy(args: List[List[Any]], ctx: Context) -> List[Any]:
 
 
 def _fn_count(args: List[List[Any]], ctx: Context) -> List[Any]:
-    return [float(len(args[0]) if args else 0)]
+    return [float(len(args[0]))] if args else [0.0]
 
 
 def _fn_empty(args: List[List[Any]], ctx: Context) -> List[Any]:
-    return [len(args[0]) == 0 if args else True]
+    return [not args[0]] if args else [True]
 
 
 def _fn_distinct(args: List[List[Any]], ctx: Context) -> List[Any]:
@@ -555,7 +887,7 @@ def _fn_distinct(args: List[List[Any]], ctx: Context) -> List[Any]:
     seen = set()
     out = []
     for item in args[0]:
-        key = to_string([item])
+        key = _item_string(item)
         if key in seen:
             continue
         seen.add(key)
@@ -572,9 +904,10 @@ def _fn_sort(args: List[List[Any]], ctx: Context) -> List[Any]:
         candidate = args[1][0]
         if isinstance(candidate, FunctionRef):
             key_fn = candidate.name
-    if key_fn:
-        return sorted(seq, key=lambda i: to_string(call_function(key_fn, [[i]], ctx)))
-    return sorted(seq, key=lambda i: to_string([i]))
+    if key_fn and seq:
+        call = _key_caller(key_fn, ctx)
+        return sorted(seq, key=lambda i: to_string(call(i)))
+    return sorted(seq, key=_item_string)
 
 
 def _fn_concat(args: List[List[Any]], ctx: Context) -> List[Any]:
@@ -617,11 +950,9 @@ def _fn_index(args: List[List[Any]], ctx: Context) -> List[Any]:
         if isinstance(candidate, FunctionRef):
             key_fn = candidate.name
     index: Dict[str, List[Any]] = {}
+    call = _key_caller(key_fn, ctx) if key_fn and seq else None
     for item in seq:
-        if key_fn:
-            key = to_string(call_function(key_fn, [[item]], ctx))
-        else:
-            key = to_string([item])
+        key = to_string(call(item)) if call else _item_string(item)
         index.setdefault(key, []).append(item)
     return [index]
 
@@ -648,11 +979,9 @@ def _fn_group_by(args: List[List[Any]], ctx: Context) -> List[Any]:
         if isinstance(candidate, FunctionRef):
             key_fn = candidate.name
     groups = {}
+    call = _key_caller(key_fn, ctx) if key_fn and seq else None
     for item in seq:
-        if key_fn:
-            key = to_string(call_function(key_fn, [[item]], ctx))
-        else:
-            key = to_string([item])
+        key = to_string(call(item)) if call else _item_string(item)
         groups.setdefault(key, []).append(item)
     return [{"key": k, "items": v} for k, v in groups.items()]
 
@@ -679,22 +1008,19 @@ def _fn_apply(args: List[List[Any]], ctx: Context) -> List[Any]:
         ruleset = to_string(args[1])
     rules = ctx.rules.get(ruleset, [])
     out: List[Any] = []
+    variables = ctx.variables
+    rule_ctx = Context(None, variables, ctx.functions, ctx.rules, ctx.position, ctx.last)
+    cases = [(rule.pattern, rule.body) for rule in rules]
+    dispatch = _case_dispatch(cases, len(seq))
     for item in seq:
-        matched = False
-        for rule in rules:
-            ok, bindings = match_pattern(rule.pattern, item)
+        for pattern, body in cases if dispatch is None else dispatch(item):
+            ok, bindings = match_pattern(pattern, item)
             if ok:
-                matched = True
-                new_vars = dict(ctx.variables)
-                new_vars.update(bindings)
-                out.extend(
-                    eval_expr(
-                        rule.body,
-                        Context(item, new_vars, ctx.functions, ctx.rules, ctx.position, ctx.last),
-                    )
-                )
+                rule_ctx.context_item = item
+                rule_ctx.variables = {**variables, **bindings} if bindings else variables
+                out.extend(eval_expr(body, rule_ctx))
                 break
-        if not matched:
+        else:
             raise RuntimeError("XFDY0001: no matching rule")
     return out
 
@@ -702,9 +1028,11 @@ def _fn_apply(args: List[List[Any]], ctx: Context) -> List[Any]:
 def _fn_sum(args: List[List[Any]], ctx: Context) -> List[Any]:
     if not args:
         return [0.0]
+    # Added left to right like before; sum() compensates for rounding on
+    # newer Pythons, which would change results.
     total = 0.0
-    for item in args[0]:
-        total += to_number([item])
+    for number in map(_item_number, args[0]):
+        total += number
     return [total]
 
 
@@ -735,3 +1063,39 @@ BUILTINS: Dict[str, Callable[[List[List[Any]], Context], List[Any]]] = {
     "position": _fn_position,
     "apply": _fn_apply,
 }
+
+
+# Single-argument builtins applied straight to the evaluated argument,
+# skipping the argument list.
+_UNARY_BUILTINS: Dict[str, Callable[[List[Any]], List[Any]]] = {
+    "count": lambda value: [float(len(value))],
+    "empty": lambda value: [not value],
+    "string": lambda value: [to_string(value)],
+    "number": lambda value: [to_number(value)],
+    "boolean": lambda value: [to_boolean(value)],
+}
+
+
+def _plain_call(fn: Callable[[List[List[Any]], Context], List[Any]]) -> Callable[[ast.FuncCall, Context], List[Any]]:
+    def call(expr: ast.FuncCall, ctx: Context) -> List[Any]:
+        return fn([eval_expr(a, ctx) for a in expr.args], ctx)
+    return call
+
+
+def _unary_call(fn: Callable[[List[List[Any]], Context], List[Any]], unary: Callable[[List[Any]], List[Any]]) -> Callable[[ast.FuncCall, Context], List[Any]]:
+    def call(expr: ast.FuncCall, ctx: Context) -> List[Any]:
+        args = expr.args
+        if len(args) == 1:
+            return unary(eval_expr(args[0], ctx))
+        return fn([eval_expr(a, ctx) for a in args], ctx)
+    return call
+
+
+# How a FuncCall naming each builtin is evaluated, so that one lookup picks
+# the calling convention as well as the function.
+_BUILTIN_CALLS: Dict[str, Callable[[ast.FuncCall, Context], List[Any]]] = {
+    name: _plain_call(fn) for name, fn in BUILTINS.items()
+}
+_BUILTIN_CALLS.update(
+    (name, _unary_call(BUILTINS[name], unary)) for name, unary in _UNARY_BUILTINS.items()
+)
@@ -1,6 +1,9 @@
 from __future__ import annotations
 
+import re
+import sys
 from dataclasses import dataclass
+from functools import lru_cache
 from typing import List, Optional, Tuple
 
 from . import ast
@@ -32,11 +35,56 @@ KEYWORDS = {
     "rule",
 }
 
+# The lexer hands out these objects for keywords. They are the interned
+# constants the parser compares token values against, so those tests
+# succeed on identity.
+_KEYWORD_VALUES = {kw: sys.intern(kw) for kw in KEYWORDS}
+
 OPERATORS = {"=", "!=", "<", "<=", ">", ">=", "+", "-", "*", ":="}
 PUNCT = {"(", ")", "{", "}", "[", "]", ",", ";", ":"}
 
 
-@dataclass
+# Comments must run to the end of the line, so a failed token match cannot
+# backtrack into them.
+_SKIP = r"(?:\s|\#[^\n]*(?![^\n]))*"
+_SKIP_RE = re.compile(_SKIP)
+
+# One alternation per token kind, tried in order after skipping whitespace and
+# comments; the group name that matched is the token kind.
+_TOKEN_RE = re.compile(
+    _SKIP
+    + r"""(?:
+        (?P<OP>:=|[<>=!+\-*]=?)
+      | (?P<PUNCT>[(){}\[\],:;])
+      | (?P<DOT>\.\.|\.//|\.)
+      | (?P<SLASH>//?)
+      | (?P<STRING>"(?:[^"\\]|\\.)*"|'(?:[^'\\]|\\.)*')
+      | (?P<NUMBER>\d[\d.]*)
+      | (?P<IDENT>[^\W\d][\w\-]*(?::[\w\-]+)*)
+      | (?P<AT>@)
+      | (?P<EOF>\Z)
+    )""",
+    re.VERBOSE | re.DOTALL,
+)
+
+_END_TAG_RE = re.compile(r"</([\w:\-]*)\s*>")
+
+# One re.sub over the literal; codecs' unicode_escape is not used because it
+# keeps unknown escapes verbatim and mangles non-Latin-1 text.
+_ESCAPE_RE = re.compile(r"\\(u[0-9A-Fa-f]{4}|.)", re.DOTALL)
+_ESCAPES = {"n": "\n", "t": "\t", "r": "\r"}
+
+
+def _unescape(m: re.Match) -> str:
+    esc = m.group(1)
+    if len(esc) == 5:
+        return chr(int(esc[1:], 16))
+    if esc == "u":
+        raise SyntaxError(f"Invalid \\u escape at {m.start()}")
+    return _ESCAPES.get(esc, esc)
+
+
+@dataclass(slots=True)
 class Token:
     kind: str
     value: str
@@ -47,19 +95,45 @@ class Lexer:
     def __init__(self, text: str) -> None:
         self.text = text
         self.pos = 0
-        self._buffer: Optional[Token] = None
+        # Lexed but not yet consumed; the parser looks at most two tokens
+        # ahead (peek2 for "text {").
+        self._lookahead: Optional[Token] = None
+        self._lookahead2: Optional[Token] = None
 
     def peek(self) -> Token:
-        if self._buffer is None:
-            self._buffer = self._next_token()
-        return self._buffer
+        tok = self._lookahead
+        if tok is None:
+            tok = self._lookahead = self._next_token()
+        return tok
 
     def next(self) -> Token:
-        if self._buffer is not None:
-            tok = self._buffer
-            self._buffer = None
-            return tok
-        return self._next_token()
+        tok = self._lookahead
+        if tok is None:
+            return self._next_token()
+        self._lookahead = self._lookahead2
+        self._lookahead2 = None
+        return tok
+
+    def at(self, kind: str, value: str) -> bool:
+        tok = self._lookahead or self.peek()
+        return tok.kind == kind and tok.value == value
+
+    def peek2(self) -> Token:
+        """Return the token after the next one without consuming either."""
+        self.peek()
+        tok = self._lookahead2
+        if tok is None:
+            tok = self._lookahead2 = self._next_token()
+        return tok
+
+    def seek(self, pos: int) -> None:
+        """Drop unconsumed lookahead and continue lexing at character ``pos``.
+
+        Constructor content is character data, not tokens; the parser scans
+        it directly and then resumes lexing after it.
+        """
+        self._lookahead = self._lookahead2 = None
+        self.pos = pos
 
     def expect(self, kind: str, value: Optional[str] = None) -> Token:
         tok = self.next()
@@ -67,126 +141,31 @@ class Lexer:
             raise SyntaxError(f"Expected {kind} {value or ''} at {tok.pos}")
         return tok
 
-    def _skip_ws_comments(self) -> None:
-        text = self.text
-        while self.pos < len(text):
-            ch = text[self.pos]
-            if ch.isspace():
-                self.pos += 1
-                continue
-            if ch == "#":
-                while self.pos < len(text) and text[self.pos] != "\n":
-                    self.pos += 1
-                continue
-            break
-
     def _next_token(self) -> Token:
-        self._skip_ws_comments()
-        if self.pos >= len(self.text):
-            return Token("EOF", "", self.pos)
-
-        ch = self.text[self.pos]
-
-        if ch == ":" and self.pos + 1 < len(self.text) and self.text[self.pos + 1] == "=":
-            start = self.pos
-            self.pos += 2
-            return Token("OP", ":=", start)
-        if ch in "(){}[],:;":
-            self.pos += 1
-            return Token("PUNCT", ch, self.pos - 1)
-
-        if ch == ".":
-            start = self.pos
-            if self.text[self.pos : self.pos + 2] == "..":
-                self.pos += 2
-                return Token("DOT", "..", start)
-            if self.text[self.pos : self.pos + 3] == ".//":
-                self.pos += 3
-                return Token("DOT", ".//", start)
-            self.pos += 1
-            return Token("DOT", ".", start)
-
-        if ch == "/":
-            start = self.pos
-            if self.text[self.pos : self.pos + 2] == "//":
-                self.pos += 2
-                return Token("SLASH", "//", start)
-            self.pos += 1
-            return Token("SLASH", "/", start)
-
-        if ch in "<>=!+-*":
-            start = self.pos
-            self.pos += 1
-            if self.pos < len(self.text) and self.text[self.pos] == "=":
-                self.pos += 1
-                return Token("OP", self.text[start:self.pos], start)
-            return Token("OP", ch, start)
-
-        if ch in "'\"":
-            quote = ch
-            start = self.pos
-            self.pos += 1
-            out = []
-            while self.pos < len(self.text):
-                ch = self.text[self.pos]
-                if ch == "\\":
-                    self.pos += 1
-                    if self.pos >= len(self.text):
-                        break
-                    esc = self.text[self.pos]
-                    if esc == "n":
-                        out.append("\n")
-                    elif esc == "t":
-                        out.append("\t")
-                    elif esc == "r":
-                        out.append("\r")
-                    elif esc == "u":
-                        hexval = self.text[self.pos + 1 : self.pos + 5]
-                        out.append(chr(int(hexval, 16)))
-                        self.pos += 4
-                    else:
-                        out.append(esc)
-                    self.pos += 1
-                    continue
-                if ch == quote:
-                    self.pos += 1
-                    return Token("STRING", "".join(out), start)
-                out.append(ch)
-                self.pos += 1
-            raise SyntaxError(f"Unterminated string at {start}")
-
-        if ch.isdigit():
-            start = self.pos
-            while self.pos < len(self.text) and (
-                self.text[self.pos].isdigit() or self.text[self.pos] == "."
-            ):
-                self.pos += 1
-            return Token("NUMBER", self.text[start:self.pos], start)
-
-        if ch.isalpha() or ch == "_":
-            start = self.pos
-            while self.pos < len(self.text):
-                c = self.text[self.pos]
-                if c == ":":
-                    if self.pos + 1 < len(self.text) and (
-                        self.text[self.pos + 1].isalnum() or self.text[self.pos + 1] in "_-"
-                    ):
-                        self.pos += 1
-                        continue
-                    break
-                if not (c.isalnum() or c in "_-"):
-                    break
-                self.pos += 1
-            val = self.text[start:self.pos]
-            if val in KEYWORDS:
-                return Token("KW", val, start)
-            return Token("IDENT", val, start)
-
-        if ch == "@":
-            self.pos += 1
-            return Token("AT", "@", self.pos - 1)
-
-        raise SyntaxError(f"Unexpected character {ch!r} at {self.pos}")
+        m = _TOKEN_RE.match(self.text, self.pos)
+        if m is None:
+            pos = _SKIP_RE.match(self.text, self.pos).end()
+            ch = self.text[pos]
+            if ch in "'\"":
+                raise SyntaxError(f"Unterminated string at {pos}")
+            raise SyntaxError(f"Unexpected character {ch!r} at {pos}")
+        kind = m.lastgroup
+        start = m.start(kind)
+        self.pos = m.end()
+        if kind == "STRING":
+            value = m.group(kind)[1:-1]
+            if "\\" in value:
+                value = _ESCAPE_RE.sub(_unescape, value)
+            return Token("STRING", value, start)
+        value = m.group(kind)
+        if kind == "IDENT":
+            keyword = _KEYWORD_VALUES.get(value)
+            if keyword is not None:
+                return Token("KW", keyword, start)
+            # Names are interned, as parse_xml does for tags, so name tests
+            # and variable lookups compare equal strings by identity.
+            return Token(kind, sys.intern(value), start)
+        return Token(kind, value, start)
 
 
 class Parser:
@@ -210,25 +189,20 @@ class Parser:
                 raise SyntaxError("XFST0005: unsupported version")
             self.lexer.expect("PUNCT", ";")
 
+        # Every declaration is identified by its leading keyword.
+        decls = {
+            "ns": lambda: self._parse_ns(namespaces),
+            "import": lambda: self._parse_import(imports),
+            "var": lambda: self._parse_var(vars_decl),
+            "def": lambda: self._parse_def(functions),
+            "rule": lambda: self._parse_rule(rules),
+        }
         while True:
             tok = self.lexer.peek()
-            if tok.kind == "KW" and tok.value == "ns":
-                self._parse_ns(namespaces)
-                continue
-            if tok.kind == "KW" and tok.value == "import":
-                self._parse_import(imports)
-                continue
-            if tok.kind == "KW" and tok.value == "var":
-                name, value = self._parse_var()
-                vars_decl[name] = value
-                continue
-            if tok.kind == "KW" and tok.value == "def":
-                self._parse_def(functions)
-                continue
-            if tok.kind == "KW" and tok.value == "rule":
-                self._parse_rule(rules)
-                continue
-            break
+            handler = decls.get(tok.value) if tok.kind == "KW" else None
+            if handler is None:
+                break
+            handler()
 
         expr = None
         if self.lexer.peek().kind != "EOF":
@@ -256,28 +230,28 @@ class Parser:
         self.lexer.expect("KW", "import")
         iri = self.lexer.expect("STRING").value
         alias = None
-        if self.lexer.peek().kind == "KW" and self.lexer.peek().value == "as":
+        if self.lexer.at("KW", "as"):
             self.lexer.next()
             alias = self.lexer.expect("IDENT").value
         self.lexer.expect("PUNCT", ";")
         imports.append((iri, alias))
 
-    def _parse_var(self) -> Tuple[str, ast.Expr]:
+    def _parse_var(self, vars_decl: dict) -> None:
         self.lexer.expect("KW", "var")
         name = self.lexer.expect("IDENT").value
         self.lexer.expect("OP", ":=")
         value = self.parse_expr()
         self.lexer.expect("PUNCT", ";")
-        return name, value
+        vars_decl[name] = value
 
     def _parse_def(self, functions: dict) -> None:
         self.lexer.expect("KW", "def")
         name = self._parse_qname()
         self.lexer.expect("PUNCT", "(")
         params: List[ast.Param] = []
-        if self.lexer.peek().kind != "PUNCT" or self.lexer.peek().value != ")":
+        if not self.lexer.at("PUNCT", ")"):
             params.append(self._parse_param())
-            while self.lexer.peek().kind == "PUNCT" and self.lexer.peek().value == ",":
+            while self.lexer.at("PUNCT", ","):
                 self.lexer.next()
                 params.append(self._parse_param())
         self.lexer.expect("PUNCT", ")")
@@ -290,10 +264,10 @@ class Parser:
         name = self.lexer.expect("IDENT").value
         type_ref = None
         default = None
-        if self.lexer.peek().kind == "PUNCT" and self.lexer.peek().value == ":":
+        if self.lexer.at("PUNCT", ":"):
             self.lexer.next()
             type_ref = self._parse_type_ref()
-        if self.lexer.peek().kind == "OP" and self.lexer.peek().value == ":=":
+        if self.lexer.at("OP", ":="):
             self.lexer.next()
             default = self.parse_expr()
         return ast.Param(name, type_ref, default)
@@ -316,14 +290,10 @@ class Parser:
 
     def parse_expr(self) -> ast.Expr:
         tok = self.lexer.peek()
-        if tok.kind == "KW" and tok.value == "if":
-            return self._parse_if()
-        if tok.kind == "KW" and tok.value == "let":
-            return self._parse_let()
-        if tok.kind == "KW" and tok.value == "for":
-            return self._parse_for()
-        if tok.kind == "KW" and tok.value == "match":
-            return self._parse_match()
+        if tok.kind == "KW":
+            handler = self._KEYWORD_EXPRS.get(tok.value)
+            if handler is not None:
+                return handler(self)
         return self._parse_or()
 
     def _parse_if(self) -> ast.Expr:
@@ -350,7 +320,7 @@ class Parser:
         self.lexer.expect("KW", "in")
         seq = self.parse_expr()
         where = None
-        if self.lexer.peek().kind == "KW" and self.lexer.peek().value == "where":
+        if self.lexer.at("KW", "where"):
             self.lexer.next()
             where = self.parse_expr()
         self.lexer.expect("KW", "return")
@@ -384,119 +354,94 @@ class Parser:
             break
         return ast.MatchExpr(target, cases, default)
 
+    # Keyword-led expressions, chosen by their first token.
+    _KEYWORD_EXPRS = {
+        "if": _parse_if,
+        "let": _parse_let,
+        "for": _parse_for,
+        "match": _parse_match,
+    }
+
+    # Binary operators by token kind, with their precedence; all of them
+    # associate to the left.
+    _BINARY_PRECEDENCE = {
+        "KW": {"or": 1, "and": 2, "div": 6, "mod": 6},
+        "OP": {"=": 3, "!=": 3, "<": 4, "<=": 4, ">": 4, ">=": 4, "+": 5, "-": 5, "*": 6},
+    }
+
     def _parse_or(self) -> ast.Expr:
-        expr = self._parse_and()
-        while self.lexer.peek().kind == "KW" and self.lexer.peek().value == "or":
-            self.lexer.next()
-            right = self._parse_and()
-            expr = ast.BinaryOp("or", expr, right)
-        return expr
+        return self._parse_binary(1)
 
-    def _parse_and(self) -> ast.Expr:
-        expr = self._parse_eq()
-        while self.lexer.peek().kind == "KW" and self.lexer.peek().value == "and":
-            self.lexer.next()
-            right = self._parse_eq()
-            expr = ast.BinaryOp("and", expr, right)
-        return expr
-
-    def _parse_eq(self) -> ast.Expr:
-        expr = self._parse_rel()
-        while self.lexer.peek().kind == "OP" and self.lexer.peek().value in ("=", "!="):
-            op = self.lexer.next().value
-            right = self._parse_rel()
-            expr = ast.BinaryOp(op, expr, right)
-        return expr
-
-    def _parse_rel(self) -> ast.Expr:
-        expr = self._parse_add()
-        while self.lexer.peek().kind == "OP" and self.lexer.peek().value in ("<", "<=", ">", ">="):
-            op = self.lexer.next().value
-            right = self._parse_add()
-            expr = ast.BinaryOp(op, expr, right)
-        return expr
-
-    def _parse_add(self) -> ast.Expr:
-        expr = self._parse_mul()
-        while self.lexer.peek().kind == "OP" and self.lexer.peek().value in ("+", "-"):
-            op = self.lexer.next().value
-            right = self._parse_mul()
-            expr = ast.BinaryOp(op, expr, right)
-        return expr
-
-    def _parse_mul(self) -> ast.Expr:
+    def _parse_binary(self, min_prec: int) -> ast.Expr:
+        # Precedence climbing: an operand costs one call per operator that
+        # follows it rather than one per precedence level.
+        lexer = self.lexer
         expr = self._parse_unary()
         while True:
-            tok = self.lexer.peek()
-            if tok.kind == "OP" and tok.value == "*":
-                self.lexer.next()
-                right = self._parse_unary()
-                expr = ast.BinaryOp("*", expr, right)
-                continue
-            if tok.kind == "KW" and tok.value in ("div", "mod"):
-                op = self.lexer.next().value
-                right = self._parse_unary()
-                expr = ast.BinaryOp(op, expr, right)
-                continue
-            break
-        return expr
+            tok = lexer.peek()
+            ops = self._BINARY_PRECEDENCE.get(tok.kind)
+            prec = ops.get(tok.value) if ops is not None else None
+            if prec is None or prec < min_prec:
+                return expr
+            lexer.next()
+            expr = ast.make_binary(tok.value, expr, self._parse_binary(prec + 1))
 
     def _parse_unary(self) -> ast.Expr:
-        tok = self.lexer.peek()
+        lexer = self.lexer
+        tok = lexer.peek()
         if tok.kind == "OP" and tok.value == "-":
-            self.lexer.next()
-            return ast.UnaryOp("-", self._parse_unary())
+            lexer.next()
+            return ast.make_negation(self._parse_unary())
         if tok.kind == "KW" and tok.value == "not":
-            self.lexer.next()
+            lexer.next()
             return ast.UnaryOp("not", self._parse_unary())
         return self._parse_primary()
 
     def _parse_primary(self) -> ast.Expr:
-        tok = self.lexer.peek()
+        lexer = self.lexer
+        tok = lexer.peek()
         if tok.kind == "NUMBER":
-            self.lexer.next()
-            return ast.Literal(float(tok.value))
+            lexer.next()
+            return ast.make_literal(float(tok.value))
         if tok.kind == "STRING":
-            self.lexer.next()
-            return ast.Literal(tok.value)
+            lexer.next()
+            return ast.make_literal(tok.value)
         if tok.kind == "PUNCT" and tok.value == "(":
-            self.lexer.next()
+            lexer.next()
             expr = self.parse_expr()
-            self.lexer.expect("PUNCT", ")")
+            lexer.expect("PUNCT", ")")
             return expr
         if tok.kind == "IDENT" and tok.value == "text":
-            saved_pos = self.lexer.pos
-            saved_buf = self.lexer._buffer
-            self.lexer.next()
-            if self.lexer.peek().kind == "PUNCT" and self.lexer.peek().value == "{":
-                self.lexer.next()
+            after = lexer.peek2()
+            if after.kind == "PUNCT" and after.value == "{":
+                lexer.next()
+                lexer.next()
                 expr = self.parse_expr()
-                self.lexer.expect("PUNCT", "}")
+                lexer.expect("PUNCT", "}")
                 return ast.TextConstructor(expr)
-            self.lexer.pos = saved_pos
-            self.lexer._buffer = saved_buf
         if tok.kind == "OP" and tok.value == "<":
             return self._parse_constructor()
         if tok.kind in ("DOT", "SLASH"):
             return self._parse_path()
         if tok.kind == "IDENT":
-            name = self.lexer.next().value
-            if self.lexer.peek().kind == "PUNCT" and self.lexer.peek().value == "(":
+            name = lexer.next().value
+            if lexer.at("PUNCT", "("):
                 return self._parse_func_call(name)
             if self._path_continues():
-                return self._parse_path(start=ast.PathStart("var", name))
+                return self._parse_path(start=ast.make_path_start("var", name))
             return ast.VarRef(name)
         raise SyntaxError(f"Unexpected token at {tok.pos}")
 
     def _parse_func_call(self, name: str) -> ast.FuncCall:
-        self.lexer.expect("PUNCT", "(")
+        lexer = self.lexer
+        lexer.expect("PUNCT", "(")
         args = []
-        if self.lexer.peek().kind != "PUNCT" or self.lexer.peek().value != ")":
+        if not lexer.at("PUNCT", ")"):
             args.append(self.parse_expr())
-            while self.lexer.peek().kind == "PUNCT" and self.lexer.peek().value == ",":
-                self.lexer.next()
+            while lexer.at("PUNCT", ","):
+                lexer.next()
                 args.append(self.parse_expr())
-        self.lexer.expect("PUNCT", ")")
+        lexer.expect("PUNCT", ")")
         return ast.FuncCall(name, args)
 
     def _path_continues(self) -> bool:
@@ -504,27 +449,28 @@ class Parser:
         return tok.kind in ("SLASH", "DOT", "AT")
 
     def _parse_path(self, start: Optional[ast.PathStart] = None) -> ast.PathExpr:
+        lexer = self.lexer
         if start is None:
-            tok = self.lexer.next()
+            tok = lexer.next()
             if tok.kind == "DOT":
                 if tok.value == ".//":
-                    start = ast.PathStart("desc")
+                    start = ast.make_path_start("desc")
                 else:
-                    start = ast.PathStart("context")
+                    start = ast.make_path_start("context")
             elif tok.kind == "SLASH":
                 if tok.value == "//":
-                    start = ast.PathStart("desc_root")
+                    start = ast.make_path_start("desc_root")
                 else:
-                    start = ast.PathStart("root")
+                    start = ast.make_path_start("root")
             else:
                 raise SyntaxError(f"Invalid path start at {tok.pos}")
 
         steps: List[ast.PathStep] = []
         if start.kind in ("root", "context", "var"):
-            tok = self.lexer.peek()
+            tok = lexer.peek()
             if tok.kind == "AT":
-                self.lexer.next()
-                test = ast.StepTest("name", self._parse_qname())
+                lexer.next()
+                test = ast.make_step_test("name", self._parse_qname())
                 steps.append(ast.PathStep("attr", test, []))
             elif tok.kind == "OP" and tok.value == "*":
                 test = self._parse_step_test()
@@ -535,19 +481,19 @@ class Parser:
                 predicates = self._parse_predicates()
                 steps.append(ast.PathStep("child", test, predicates))
         if start.kind in ("desc", "desc_root"):
-            tok = self.lexer.peek()
+            tok = lexer.peek()
             if tok.kind in ("IDENT", "OP") or (tok.kind == "IDENT" and tok.value in ("text", "node", "comment", "pi")):
                 test = self._parse_step_test()
                 predicates = self._parse_predicates()
                 steps.append(ast.PathStep("desc_or_self", test, predicates))
         while True:
-            tok = self.lexer.peek()
+            tok = lexer.peek()
             if tok.kind == "SLASH":
                 axis = "child" if tok.value == "/" else "desc"
-                self.lexer.next()
-                if self.lexer.peek().kind == "AT":
-                    self.lexer.next()
-                    test = ast.StepTest("name", self._parse_qname())
+                lexer.next()
+                if lexer.peek().kind == "AT":
+                    lexer.next()
+                    test = ast.make_step_test("name", self._parse_qname())
                     axis = "attr"
                     predicates = []
                 else:
@@ -557,47 +503,49 @@ class Parser:
                 continue
             if tok.kind == "DOT":
                 if tok.value == ".":
-                    self.lexer.next()
-                    if self.lexer.peek().kind == "AT":
-                        self.lexer.next()
-                        test = ast.StepTest("name", self._parse_qname())
+                    lexer.next()
+                    if lexer.peek().kind == "AT":
+                        lexer.next()
+                        test = ast.make_step_test("name", self._parse_qname())
                         steps.append(ast.PathStep("attr", test, []))
                     else:
-                        steps.append(ast.PathStep("self", ast.StepTest("node"), []))
+                        steps.append(ast.PathStep("self", ast.make_step_test("node"), []))
                     continue
                 if tok.value == "..":
-                    self.lexer.next()
-                    steps.append(ast.PathStep("parent", ast.StepTest("node"), []))
+                    lexer.next()
+                    steps.append(ast.PathStep("parent", ast.make_step_test("node"), []))
                     continue
             if tok.kind == "AT":
-                self.lexer.next()
-                test = ast.StepTest("name", self._parse_qname())
+                lexer.next()
+                test = ast.make_step_test("name", self._parse_qname())
                 steps.append(ast.PathStep("attr", test, []))
                 continue
             break
         return ast.PathExpr(start, steps)
 
     def _parse_step_test(self) -> ast.StepTest:
-        tok = self.lexer.peek()
+        lexer = self.lexer
+        tok = lexer.peek()
         if tok.kind == "OP" and tok.value == "*":
-            self.lexer.next()
-            return ast.StepTest("wildcard")
+            lexer.next()
+            return ast.make_step_test("wildcard")
         if tok.kind == "IDENT":
             if tok.value in ("text", "node", "comment", "pi"):
-                self.lexer.next()
-                self.lexer.expect("PUNCT", "(")
-                self.lexer.expect("PUNCT", ")")
-                return ast.StepTest(tok.value)
+                lexer.next()
+                lexer.expect("PUNCT", "(")
+                lexer.expect("PUNCT", ")")
+                return ast.make_step_test(tok.value)
             name = self._parse_qname()
-            return ast.StepTest("name", name)
+            return ast.make_step_test("name", name)
         raise SyntaxError(f"Invalid step test at {tok.pos}")
 
     def _parse_predicates(self) -> List[ast.Expr]:
+        lexer = self.lexer
         preds = []
-        while self.lexer.peek().kind == "PUNCT" and self.lexer.peek().value == "[":
-            self.lexer.next()
+        while lexer.at("PUNCT", "["):
+            lexer.next()
             preds.append(self.parse_expr())
-            self.lexer.expect("PUNCT", "]")
+            lexer.expect("PUNCT", "]")
         return preds
 
     def _parse_qname(self) -> str:
@@ -623,11 +571,11 @@ class Parser:
             self.lexer.expect("OP", ">")
             var: Optional[str] = None
             child: Optional[ast.Pattern] = None
-            if self.lexer.peek().kind == "PUNCT" and self.lexer.peek().value == "{":
+            if self.lexer.at("PUNCT", "{"):
                 self.lexer.next()
                 var = self.lexer.expect("IDENT").value
                 self.lexer.expect("PUNCT", "}")
-            elif self.lexer.peek().kind == "OP" and self.lexer.peek().value == "<":
+            elif self.lexer.at("OP", "<"):
                 child = self._parse_pattern()
             else:
                 raise SyntaxError("Invalid element pattern content")
@@ -641,84 +589,103 @@ class Parser:
         raise SyntaxError(f"Invalid pattern at {tok.pos}")
 
     def _parse_constructor(self) -> ast.Constructor:
-        self.lexer.expect("OP", "<")
+        lexer = self.lexer
+        lexer.expect("OP", "<")
         name = self._parse_qname()
         attrs: List[Tuple[str, ast.Expr]] = []
         while True:
-            tok = self.lexer.peek()
+            tok = lexer.peek()
             if tok.kind == "OP" and tok.value == ">":
-                self.lexer.next()
+                lexer.next()
                 break
             if tok.kind == "SLASH" and tok.value == "/":
-                self.lexer.next()
-                self.lexer.expect("OP", ">")
+                lexer.next()
+                lexer.expect("OP", ">")
                 return ast.Constructor(name, attrs, [])
             attr_name = self._parse_qname()
-            self.lexer.expect("OP", "=")
-            self.lexer.expect("PUNCT", "{")
+            lexer.expect("OP", "=")
+            lexer.expect("PUNCT", "{")
             expr = self.parse_expr()
-            self.lexer.expect("PUNCT", "}")
+            lexer.expect("PUNCT", "}")
             attrs.append((attr_name, expr))
         contents: List[ast.Content] = []
-        self.lexer._buffer = None
+        lexer.seek(lexer.pos)
+        source = self.text
         while True:
-            if self.lexer.pos >= len(self.text):
+            # Dispatch on the next character; anything else starts a run of
+            # character data, which _parse_chardata takes in one slice.
+            pos = lexer.pos
+            if pos >= len(source):
                 raise SyntaxError("Unterminated constructor")
-            if self.text.startswith("</", self.lexer.pos):
-                end_name, new_pos = self._read_end_tag()
-                if end_name != name:
-                    raise SyntaxError("Mismatched end tag")
-                self.lexer.pos = new_pos
-                self.lexer._buffer = None
-                break
-            if self.text.startswith("text{", self.lexer.pos):
-                self.lexer.pos += 4
-                self.lexer._buffer = None
-                self.lexer.expect("PUNCT", "{")
-                expr = self.parse_expr()
-                self.lexer.expect("PUNCT", "}")
-                contents.append(ast.TextConstructor(expr))
-                continue
-            ch = self.text[self.lexer.pos]
+            ch = source[pos]
             if ch == "<":
-                self.lexer._buffer = None
+                if source.startswith("</", pos):
+                    end_name, new_pos = self._read_end_tag()
+                    if end_name != name:
+                        raise SyntaxError("Mismatched end tag")
+                    lexer.seek(new_pos)
+                    break
                 contents.append(self._parse_constructor())
                 continue
             if ch == "{":
-                self.lexer.pos += 1
-                self.lexer._buffer = None
+                lexer.seek(pos + 1)
                 expr = self.parse_expr()
-                self.lexer.expect("PUNCT", "}")
+                lexer.expect("PUNCT", "}")
                 contents.append(ast.Interp(expr))
                 continue
+            if ch == "t" and source.startswith("text{", pos):
+                lexer.seek(pos + 4)
+                lexer.expect("PUNCT", "{")
+                expr = self.parse_expr()
+                lexer.expect("PUNCT", "}")
+                contents.append(ast.TextConstructor(expr))
+                continue
             text = self._parse_chardata()
             if text and text.strip():
                 contents.append(ast.Text(text))
         return ast.Constructor(name, attrs, contents)
 
     def _parse_chardata(self) -> str:
-        text = []
-        while True:
-            if self.lexer.pos >= len(self.text):
-                break
-            ch = self.text[self.lexer.pos]
-            if ch == "<" or ch == "{":
-                break
-            text.append(ch)
-            self.lexer.pos += 1
-        return "".join(text)
+        # Character data runs to the next "<" or "{". str.find scans in C;
+        # the "{" search stops at the "<", so neither looks past the data.
+        text = self.text
+        start = self.lexer.pos
+        end = text.find("<", start)
+        if end < 0:
+            end = len(text)
+        brace = text.find("{", start, end)
+        if brace >= 0:
+            end = brace
+        self.lexer.pos = end
+        return text[start:end]
 
     def _read_end_tag(self) -> Tuple[str, int]:
-        pos = self.lexer.pos
-        if not self.text.startswith("</", pos):
-            raise SyntaxError("Expected end tag")
-        pos += 2
-        start = pos
-        while pos < len(self.text) and (self.text[pos].isalnum() or self.text[pos] in "_:-"):
-            pos += 1
-        name = self.text[start:pos]
-        while pos < len(self.text) and self.text[pos].isspace():
-            pos += 1
-        if pos >= len(self.text) or self.text[pos] != ">":
+        m = _END_TAG_RE.match(self.text, self.lexer.pos)
+        if m is None:
+            if not self.text.startswith("</", self.lexer.pos):
+                raise SyntaxError("Expected end tag")
             raise SyntaxError("Unterminated end tag")
-        return name, pos + 1
+        return m.group(1), m.end()
+
+
+def parse_source(source: str) -> ast.Module:
+    """Parse a module once per process and share its AST between evaluations.
+
+    The AST is never mutated, but the module's tables are plain containers,
+    so every caller gets its own copies of them and cannot change what later
+    callers see.
+    """
+    module = _parse_source_cached(source)
+    return ast.Module(
+        functions=dict(module.functions),
+        rules={name: list(defs) for name, defs in module.rules.items()},
+        vars=dict(module.vars),
+        namespaces=dict(module.namespaces),
+        imports=list(module.imports),
+        expr=module.expr,
+    )
+
+
+@lru_cache(maxsize=128)
+def _parse_source_cached(source: str) -> ast.Module:
+    return Parser(source).parse_module()
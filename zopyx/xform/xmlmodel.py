@@ -1,11 +1,12 @@
 from __future__ import annotations
 
 from dataclasses import dataclass, field
-from typing import Dict, List, Optional, Iterable
+import sys
+from typing import Dict, Iterable, List, Optional
 import xml.etree.ElementTree as ET
 
 
-@dataclass
+@dataclass(slots=True)
 class Node:
     kind: str  # document, element, attribute, text, comment, pi
     name: Optional[str] = None
@@ -15,13 +16,21 @@ class Node:
     parent: Optional["Node"] = None
 
     def string_value(self) -> str:
-        if self.kind == "text":
+        kind = self.kind
+        if kind == "text" or kind == "attribute":
             return self.value or ""
-        if self.kind == "attribute":
-            return self.value or ""
-        if self.kind in ("element", "document"):
-            return "".join(child.string_value() for child in self.children)
-        return ""
+        if kind != "element" and kind != "document":
+            return ""
+        # Not cached: nodes are mutable, so the text can change at any time.
+        parts: List[str] = []
+        stack = self.children[::-1]
+        while stack:
+            node = stack.pop()
+            if node.kind == "text" or node.kind == "attribute":
+                parts.append(node.value or "")
+            elif node.children:
+                stack.extend(reversed(node.children))
+        return "".join(parts)
 
 
 def parse_xml(text: str) -> Node:
@@ -34,63 +43,136 @@ def parse_xml(text: str) -> Node:
 
 
 def _build_element(el: ET.Element) -> Node:
-    node = Node(kind="element", name=el.tag, attrs=dict(el.attrib))
-    children: List[Node] = []
-
-    if el.text:
-        children.append(Node(kind="text", value=el.text, parent=node))
-
-    for child in list(el):
-        child_node = _build_element(child)
-        child_node.parent = node
-        children.append(child_node)
-        if child.tail:
-            children.append(Node(kind="text", value=child.tail, parent=node))
-
-    node.children = children
-    return node
+    # Worklist instead of recursion, so deeply nested input cannot hit the
+    # recursion limit. Each node's children are complete once it is popped,
+    # so the order nodes are processed in does not matter.
+    # Tags are interned so that name tests against interned query names
+    # succeed on the identity check. The attribute dicts ElementTree built
+    # are not used by anything else, so nodes take them over uncopied.
+    root = Node(kind="element", name=sys.intern(el.tag), attrs=el.attrib)
+    pending = [(el, root)]
+    while pending:
+        el, node = pending.pop()
+        children: List[Node] = []
+        if el.text:
+            children.append(Node(kind="text", value=el.text, parent=node))
+        for child in el:
+            child_node = Node(kind="element", name=sys.intern(child.tag), attrs=child.attrib, parent=node)
+            children.append(child_node)
+            if len(child):
+                pending.append((child, child_node))
+            elif child.text:
+                child_node.children = [Node(kind="text", value=child.text, parent=child_node)]
+            if child.tail:
+                children.append(Node(kind="text", value=child.tail, parent=node))
+        node.children = children
+    return root
+
+
+def children_named(node: Node, name: str) -> List[Node]:
+    """The element children of node called name, in document order."""
+    return [c for c in node.children if c.kind == "element" and c.name == name]
 
 
 def deep_copy(node: Node, recurse: bool = True) -> Node:
     copied = Node(kind=node.kind, name=node.name, value=node.value, attrs=dict(node.attrs))
-    if recurse:
-        copied.children = [deep_copy(c, recurse=recurse) for c in node.children]
-        for c in copied.children:
-            c.parent = copied
+    if not recurse:
+        return copied
+    # Worklist instead of recursion, as in _build_element.
+    pending = [(node, copied)]
+    while pending:
+        src, dst = pending.pop()
+        children: List[Node] = []
+        for child in src.children:
+            child_copy = Node(kind=child.kind, name=child.name, value=child.value, attrs=dict(child.attrs), parent=dst)
+            children.append(child_copy)
+            if child.children:
+                pending.append((child, child_copy))
+        dst.children = children
     return copied
 
 
+def element_children(node: Node) -> List[Node]:
+    """The element children of node, without the text between them.
+
+    Not cached: nodes are mutable, so the children can change at any time.
+    """
+    return [c for c in node.children if c.kind == "element"]
+
+
 def iter_descendants(node: Node) -> Iterable[Node]:
-    for child in node.children:
+    # Explicit stack: document order without nested generators or a
+    # recursion limit on deep trees.
+    stack = node.children[::-1]
+    while stack:
+        child = stack.pop()
         yield child
-        yield from iter_descendants(child)
+        if child.children:
+            stack.extend(reversed(child.children))
+
+
+def descendants(node: Node) -> List[Node]:
+    """Like iter_descendants, but builds the list without a generator."""
+    out: List[Node] = []
+    append = out.append
+    stack = list(reversed(node.children))
+    while stack:
+        child = stack.pop()
+        append(child)
+        if child.children:
+            stack.extend(reversed(child.children))
+    return out
 
 
 def serialize(item: Node) -> str:
-    if item.kind == "document":
-        return "".join(serialize(c) for c in item.children)
-    if item.kind == "text":
-        return _escape_text(item.value or "")
-    if item.kind == "attribute":
-        return _escape_attr(item.value or "")
-    if item.kind == "element":
-        attrs = "".join(
-            f" {name}=\"{_escape_attr(value)}\"" for name, value in item.attrs.items()
-        )
-        if not item.children:
-            return f"<{item.name}{attrs}/>"
-        inner = "".join(serialize(c) for c in item.children)
-        return f"<{item.name}{attrs}>{inner}</{item.name}>"
-    return ""
+    # Explicit stack, so output depth is not bound by the recursion limit;
+    # closing tags are pushed as plain strings. Everything goes into one
+    # parts list that is joined once.
+    parts: List[str] = []
+    write = parts.append
+    stack: List[object] = [item]
+    push = stack.append
+    pop = stack.pop
+    while stack:
+        node = pop()
+        if type(node) is str:
+            write(node)
+            continue
+        kind = node.kind
+        if kind == "element":
+            name = node.name
+            write(f"<{name}")
+            for attr_name, value in node.attrs.items():
+                write(f" {attr_name}=\"{_escape_attr(value)}\"")
+            children = node.children
+            if not children:
+                write("/>")
+            elif len(children) == 1 and children[0].kind == "text":
+                # Text-only leaves are written in one go.
+                write(f">{_escape_text(children[0].value or '')}</{name}>")
+            else:
+                write(">")
+                push(f"</{name}>")
+                stack.extend(reversed(children))
+        elif kind == "text":
+            write(_escape_text(node.value or ""))
+        elif kind == "document":
+            stack.extend(reversed(node.children))
+        elif kind == "attribute":
+            write(_escape_attr(node.value or ""))
+    return "".join(parts)
 
 
 def _escape_text(text: str) -> str:
-    return (
-        text.replace("&", "&amp;")
-        .replace("<", "&lt;")
-        .replace(">", "&gt;")
-    )
+    # Most text has nothing to escape; the membership tests are cheaper
+    # than three no-op replace() scans. str.translate measured slower
+    # than replace() on all but long strings full of markup.
+    if "&" in text or "<" in text or ">" in text:
+        return text.replace("&", "&amp;").replace("<", "&lt;").replace(">", "&gt;")
+    return text
 
 
 def _escape_attr(text: str) -> str:
-    return _escape_text(text).replace('"', "&quot;")
+    if '"' in text:
+        return _escape_text(text).replace('"', "&quot;")
+    return _escape_text(text)